@@ -0,0 +1,77 @@
+"""Measure how parallel generation scales with the number of processes.
+
+Usage: python benchmarks/parallel_scaling.py [username_length] [max_workers]
+
+Times write_email_variations to a plain file serially and with 2, 4, ...
+workers up to max_workers (default: the CPU count), where the workers
+write their shards in place, then the same for the streamed
+iter_email_variation_chunks_parallel, whose bytes all pass through the
+parent. Prints throughput and speed-up over the serial run.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_generator import (  # noqa: E402
+    iter_email_variation_chunks,
+    iter_email_variation_chunks_parallel,
+    write_email_variations,
+)
+
+
+def _consume(chunks):
+    """Consume a chunk stream, returning (bytes, seconds)."""
+    started = time.perf_counter()
+    size = sum(len(chunk) for chunk in chunks)
+    return size, time.perf_counter() - started
+
+
+def _write(email, path, workers):
+    """Write the variations to a file, returning (bytes, seconds)."""
+    stats = write_email_variations(email, path, workers=workers)
+    return stats["bytes"], stats["seconds"]
+
+
+def _report(label, serial, size, seconds):
+    print(
+        f"{label:<12} {seconds:6.2f}s  {size / seconds / 1e6:7.0f} MB/s"
+        f"  x{serial / seconds:.2f}"
+    )
+
+
+def main():
+    length = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    email = "abcdefghijklmnopqrstuvwxyz0123456789"[:length] + "@gmail.com"
+    counts = []
+    workers = 2
+    while workers <= max(max_workers, 2):
+        counts.append(workers)
+        workers *= 2
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "variations.txt")
+        size, serial = _write(email, path, None)
+        print(f"{email}: {size / 1e6:.0f} MB, {os.cpu_count()} CPUs")
+        print("file output (workers write in place)")
+        _report("serial", serial, size, serial)
+        for workers in counts:
+            _report(f"workers={workers}", serial, *_write(email, path, workers))
+
+    size, serial = _consume(iter_email_variation_chunks(email))
+    print("streamed output (bytes pass through the parent)")
+    _report("serial", serial, size, serial)
+    for workers in counts:
+        _report(
+            f"workers={workers}",
+            serial,
+            *_consume(iter_email_variation_chunks_parallel(email, workers=workers)),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,345 @@
+import argparse
+import bz2
+import gzip
+import hashlib
+import lzma
+import mmap
+import os
+import random
 import re
+import sqlite3
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque, namedtuple
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import accumulate, chain, islice
+from math import comb
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for .zst output
+    zstandard = None
+
+# Number of dot masks handed to a worker process at a time
+DEFAULT_SHARD_SIZE = 1 << 16
+
+# Dot tables are cached for usernames with at most this many dot gaps,
+# keeping up to DOT_TABLE_CACHE_SIZE of them. A 20-gap entry holds two
+# 1024-string tables, about 0.15 MB, so the cache tops out near 5 MB
+DOT_TABLE_CACHE_GAPS = 20
+
+# Longer usernames use a prefix table over this many gaps and build each
+# suffix row on the fly
+DOT_PREFIX_GAPS = DOT_TABLE_CACHE_GAPS // 2
+DOT_TABLE_CACHE_SIZE = 32
+
+# Variations generated between two progress callbacks
+PROGRESS_CHUNK_SIZE = 16384
+
+# Lines joined per write and buffer size for streamed output
+WRITE_CHUNK_SIZE = 8192
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# CLI exit status codes (argparse uses 2 for usage errors)
+EXIT_OK = 0
+EXIT_INVALID_INPUT = 1
+EXIT_OUTPUT_ERROR = 3
+
+# Output compression inferred from the file extension
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+
+# Suffix of the offset index written next to an indexed output file
+INDEX_SUFFIX = ".idx"
+
+# Header and body lines of the numbered text format
+NUMBERED_HEADER = "Email Variations Generated"
+NUMBERED_LINE = re.compile(r"\d+\. (\S+)$")
+
+# Keywords used for + variations when none are given
+DEFAULT_KEYWORDS = ["netflix", "amazon", "signup", "test", "shop"]
+
+# Variation families that can be selected with ``families=``
+FAMILIES = ("dot", "plus", "hyphen_underscore", "subdomain")
+
+# Which transforms a mail provider actually routes to the same mailbox:
+# dots ignored, the tag separator (or None), hyphen/underscore forms, and
+# keyword@username.domain subdomain addressing.
+Provider = namedtuple(
+    "Provider", ["name", "dots", "tag_separator", "hyphen_underscore", "subdomain"]
+)
+
+GMAIL = Provider("gmail", True, "+", False, False)
+OUTLOOK = Provider("outlook", False, "+", False, False)
+YAHOO = Provider("yahoo", False, "-", False, False)
+ICLOUD = Provider("icloud", False, "+", False, False)
+FASTMAIL = Provider("fastmail", False, "+", False, True)
+
+# Unknown domains may run catch-all rules, so every transform applies
+CUSTOM_DOMAIN = Provider("custom", True, "+", True, False)
+
+PROVIDERS = {
+    "gmail.com": GMAIL,
+    "googlemail.com": GMAIL,
+    "outlook.com": OUTLOOK,
+    "hotmail.com": OUTLOOK,
+    "live.com": OUTLOOK,
+    "msn.com": OUTLOOK,
+    "yahoo.com": YAHOO,
+    "ymail.com": YAHOO,
+    "rocketmail.com": YAHOO,
+    "icloud.com": ICLOUD,
+    "me.com": ICLOUD,
+    "mac.com": ICLOUD,
+    "fastmail.com": FASTMAIL,
+    "fastmail.fm": FASTMAIL,
+}
+
+# Groups held in memory by dedupe_addresses before spilling to disk
+DEFAULT_DEDUPE_GROUPS = 1_000_000
+DEFAULT_DEDUPE_PARTITIONS = 64
+
+# Memory budget of a VariationCache, in bytes
+DEFAULT_CACHE_BYTES = 256 << 20
+
+# Domains that deliver to the same mailboxes as another domain
+CANONICAL_DOMAINS = {"googlemail.com": "gmail.com"}
+
+# Accepted address format, and the username part of it on its own
+EMAIL_PATTERN = re.compile(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
+LOCAL_PART_PATTERN = re.compile(r"[a-zA-Z0-9._%+-]+$")
+
+# A single DNS label, as needed for keyword@username.domain addressing
+DNS_LABEL_PATTERN = re.compile(r"[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\Z")
+
+
+class InvalidEmailError(ValueError):
+    """Raised for a malformed address; ``reason`` says what is wrong."""
+
+    def __init__(self, address, reason):
+        super().__init__(f"Invalid email format: {reason}")
+        self.address = address
+        self.reason = reason
 
 
 def is_valid_email(email):
     """Validate the email address format."""
-    pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
-    return re.match(pattern, email) is not None
+    # Exactly one "@" is cheap to check and rejects most bad input early
+    return email.count("@") == 1 and EMAIL_PATTERN.match(email) is not None
+
+
+def email_error(email):
+    """Return why an address is invalid, or None if it is valid."""
+    ats = email.count("@")
+    if ats == 0:
+        return "missing @"
+    if ats > 1:
+        return "more than one @"
+    if EMAIL_PATTERN.match(email) is not None:
+        return None
+
+    username, domain = email.split("@")
+    if not username:
+        return "empty username"
+    if not LOCAL_PART_PATTERN.match(username):
+        return "invalid character in username"
+    if "." not in domain:
+        return "domain has no top-level domain"
+    return "invalid domain"
+
+
+def validate_email(email):
+    """Raise InvalidEmailError unless the address is valid."""
+    if not is_valid_email(email):
+        raise InvalidEmailError(email, email_error(email))
+
+
+def validate_many(addresses):
+    """Partition addresses into valid ones and invalid ones with reasons.
+
+    Returns ``(valid, invalid)`` where ``invalid`` holds
+    ``(address, reason)`` pairs, both in input order.
+    """
+    valid = []
+    invalid = []
+    match = EMAIL_PATTERN.match
+    for address in addresses:
+        if address.count("@") == 1 and match(address) is not None:
+            valid.append(address)
+        else:
+            invalid.append((address, email_error(address)))
+    return valid, invalid
+
+
+def _dot_segments(username):
+    """Split the username at every gap where a dot may be inserted.
+
+    Returns None when no dot variation can be valid, i.e. the username
+    already has a leading, trailing or doubled dot.
+    """
+    if not username or username[0] == "." or username[-1] == "." or ".." in username:
+        return None
+
+    # A gap is usable only if neither neighbour is already a dot
+    segments = []
+    start = 0
+    for pos in range(len(username) - 1):
+        if username[pos] != "." and username[pos + 1] != ".":
+            segments.append(username[start : pos + 1])
+            start = pos + 1
+    segments.append(username[start:])
+    return segments
+
+
+def _dot_count(segments):
+    """Number of dot variations for a segmented username."""
+    return 2 ** (len(segments) - 1) if segments is not None else 0
+
+
+def _expand_dot_table(table, segment):
+    """Double a table of partial variants with one more dot gap."""
+    return [part + segment for part in table] + [part + "." + segment for part in table]
+
+
+def _build_dot_tables(segments):
+    """Build the prefix and suffix tables of a segmented username."""
+    split = (len(segments) - 1) // 2
+
+    prefixes = [segments[0]]
+    for segment in segments[1 : split + 1]:
+        prefixes = _expand_dot_table(prefixes, segment)
+
+    suffixes = [""]
+    for segment in segments[split + 1 :]:
+        suffixes = _expand_dot_table(suffixes, segment)
+
+    return tuple(prefixes), tuple(suffixes)
+
+
+_cached_dot_tables = lru_cache(maxsize=DOT_TABLE_CACHE_SIZE)(_build_dot_tables)
+
+
+def _dot_tables(segments):
+    """Return the domain-independent tables, shared between calls.
+
+    Tables depend only on the username, so the same local part on other
+    domains reuses them. Tables too large to keep around are rebuilt.
+    """
+    segments = tuple(segments)
+    if len(segments) - 1 <= DOT_TABLE_CACHE_GAPS:
+        return _cached_dot_tables(segments)
+    return _build_dot_tables(segments)
+
+
+def _dot_halves(segments, suffix=""):
+    """Precompute the prefix and suffix tables for a segmented username.
+
+    The first half of the gaps forms the low bits of the mask and the
+    second half the high bits, so every variant is a single join of one
+    prefix and one suffix. The returned tables must not be modified.
+    """
+    prefixes, suffixes = _dot_tables(segments)
+    if suffix:
+        suffixes = [part + suffix for part in suffixes]
+    return prefixes, suffixes
+
+
+def _dot_rows(segments, start, stop):
+    """Plan the masks ``start``..``stop`` as rows sharing their high bits.
+
+    Returns the prefix table and an iterator of ``(tail, first, last)``
+    rows: mask ``high * width + low`` for ``first <= low < last`` is
+    ``prefixes[low] + tail``. Only the rows in the range are built, and
+    past DOT_TABLE_CACHE_GAPS gaps the prefix table stays at
+    ``2 ** DOT_PREFIX_GAPS`` entries, so memory does not grow with the
+    length of the username or the size of its space.
+    """
+    if len(segments) - 1 <= DOT_TABLE_CACHE_GAPS:
+        prefixes, suffixes = _dot_tables(segments)
+        tail_of = suffixes.__getitem__
+    else:
+        prefixes = [segments[0]]
+        for segment in segments[1 : DOT_PREFIX_GAPS + 1]:
+            prefixes = _expand_dot_table(prefixes, segment)
+        rest = segments[DOT_PREFIX_GAPS + 1 :]
+
+        def tail_of(high):
+            return "".join(
+                "." + segment if (high >> bit) & 1 else segment
+                for bit, segment in enumerate(rest)
+            )
+
+    width = len(prefixes)
+    rows = (
+        (tail_of(high), max(start - high * width, 0), min(stop - high * width, width))
+        for high in range(start // width, -(-stop // width))
+    )
+    return prefixes, rows
+
+
+def iter_dot_variations(username, suffix="", start=0, stop=None):
+    """Yield every valid dot variation of the username in mask order.
+
+    Bit ``i`` of the mask places a dot in the ``i``-th usable gap. The
+    optional suffix (e.g. ``"@gmail.com"``) is joined in for free, and
+    ``start``/``stop`` restrict the output to a contiguous mask range.
+    """
+    segments = _dot_segments(username)
+    if segments is None:
+        return
+    stop = _dot_count(segments) if stop is None else min(stop, _dot_count(segments))
+    if start >= stop:
+        return
+
+    prefixes, rows = _dot_rows(segments, start, stop)
+    for tail, first, last in rows:
+        tail += suffix
+        for head in prefixes[first:last]:
+            yield head + tail
+
+
+def iter_dot_variation_chunks(
+    username, suffix="", start=0, stop=None, chunk_size=DEFAULT_SHARD_SIZE
+):
+    """Yield the dot variations as newline-terminated UTF-8 bytes chunks.
+
+    The output matches iter_dot_variations (mask order, same ``start`` and
+    ``stop``) but comes as ready-to-write bytes of about ``chunk_size``
+    lines each. Every run of variations sharing a suffix-table entry is
+    written by one ``bytes.join`` over the prefix table, so no per-variation
+    Python code runs at all.
+    """
+    segments = _dot_segments(username)
+    if segments is None:
+        return
+    stop = _dot_count(segments) if stop is None else min(stop, _dot_count(segments))
+    if start >= stop:
+        return
+
+    prefixes, rows = _dot_rows(segments, start, stop)
+    prefixes = [head.encode("utf-8") for head in prefixes]
+    end = suffix.encode("utf-8") + b"\n"
+
+    blocks = []
+    pending = 0
+    for tail, first, last in rows:
+        heads = prefixes[first:last]
+        # Joining on "tail + suffix" lays out the whole row in one call
+        separator = tail.encode("utf-8") + end
+        blocks.append(separator.join(heads) + separator)
+        pending += len(heads)
+        if pending >= chunk_size:
+            yield b"".join(blocks)
+            blocks = []
+            pending = 0
+    if blocks:
+        yield b"".join(blocks)
 
 
 def generate_dot_variations(username):
@@ -12,31 +347,14 @@ def generate_dot_variations(username):
     if not username:
         return []
 
-    # Get all possible positions for dots (between characters)
-    positions = len(username) - 1
-    variations = set()
+    return set(iter_dot_variations(username))
 
-    # Generate all combinations of dot placements
-    for i in range(2**positions):
-        variation = list(username)
-        offset = 0
-        for pos in range(positions):
-            if (i >> pos) & 1:
-                variation.insert(pos + 1 + offset, ".")
-                offset += 1
-        variation = "".join(variation)
-        # Only add valid variations (no consecutive dots, no leading/trailing dots)
-        if ".." not in variation and variation[0] != "." and variation[-1] != ".":
-            variations.add(variation)
-
-    return variations
 
-
-def generate_plus_variations(username, keywords=None):
+def generate_plus_variations(username, keywords=None, separator="+"):
     """Generate +something variations for the username."""
     if not keywords:
-        keywords = ["netflix", "amazon", "signup", "test", "shop"]
-    return [f"{username}+{keyword}" for keyword in keywords]
+        keywords = DEFAULT_KEYWORDS
+    return [f"{username}{separator}{keyword}" for keyword in keywords]
 
 
 def generate_hyphen_underscore_variations(username):
@@ -47,64 +365,2016 @@ def generate_hyphen_underscore_variations(username):
     return variations
 
 
+def register_provider(domains, provider):
+    """Register the routing rules of a provider for one or more domains."""
+    if isinstance(domains, str):
+        domains = [domains]
+    for domain in domains:
+        PROVIDERS[domain.lower()] = provider
+    resolve_provider.cache_clear()
+
+
+@lru_cache(maxsize=1024)
+def resolve_provider(domain):
+    """Return the provider rules for a domain, CUSTOM_DOMAIN if unknown."""
+    return PROVIDERS.get(domain.lower(), CUSTOM_DOMAIN)
+
+
+def _dot_mask(local, segments):
+    """Return the mask of a dot variation, or None if it is not one."""
+    if segments is None:
+        return None
+
+    mask = 0
+    pos = 0
+    for i, segment in enumerate(segments):
+        if i and local.startswith(".", pos):
+            mask |= 1 << (i - 1)
+            pos += 1
+        if not local.startswith(segment, pos):
+            return None
+        pos += len(segment)
+    return mask if pos == len(local) else None
+
+
+def _extra_variations(
+    username,
+    domain,
+    segments,
+    include_hyphen_underscore,
+    custom_keywords,
+    provider=CUSTOM_DOMAIN,
+    families=FAMILIES,
+    keyword_prefix=None,
+):
+    """Build the non-dot variations in emission order, without duplicates.
+
+    Uniqueness follows from the shape of each family, so no address is
+    hashed or compared:
+
+    - tagged variants keep every letter of the username plus the
+      separator, so they never match a dot variation (which only moves
+      dots around), and are distinct once the keywords are
+    - the hyphen/underscore forms are new only when the username has a
+      dot; they keep its length, unlike tagged variants, and gain a
+      letter that dot variations lack
+    - subdomain variants are the only ones on another domain; they are
+      only made when the username is a single DNS label
+    """
+    extras = []
+    # Blank keywords would give "user+@..." or an empty subdomain local part
+    keywords = [k.strip() for k in custom_keywords or DEFAULT_KEYWORDS]
+    keywords = list(dict.fromkeys(k for k in keywords if k))
+    if keyword_prefix:
+        keywords = [k for k in keywords if k.startswith(keyword_prefix)]
+
+    # The original address is only missing when no dot variation is valid
+    if segments is None and "dot" in families:
+        extras.append(f"{username}@{domain}")
+
+    if provider.tag_separator and keywords and "plus" in families:
+        for local in generate_plus_variations(
+            username, keywords, provider.tag_separator
+        ):
+            extras.append(f"{local}@{domain}")
+
+    if (
+        include_hyphen_underscore
+        and provider.hyphen_underscore
+        and "hyphen_underscore" in families
+        and "." in username
+    ):
+        extras.append(f"{username.replace('.', '-')}@{domain}")
+        extras.append(f"{username.replace('.', '_')}@{domain}")
+
+    # The username becomes a host name, so it must be one valid DNS label
+    if (
+        provider.subdomain
+        and "subdomain" in families
+        and DNS_LABEL_PATTERN.match(username)
+    ):
+        for keyword in keywords:
+            extras.append(f"{keyword}@{username}.{domain}")
+    return extras
+
+
+def _plan_variations(
+    email,
+    include_hyphen_underscore,
+    custom_keywords,
+    provider_rules,
+    families=FAMILIES,
+    keyword_prefix=None,
+):
+    """Resolve which families apply to an address.
+
+    Returns ``(username, domain, segments, extras)`` where ``segments`` is
+    None when there is no dot family. Without provider rules every
+    transform is applied, as for a custom domain.
+    """
+    username, domain = email.split("@")
+    provider = resolve_provider(domain) if provider_rules else CUSTOM_DOMAIN
+    segments = None
+    if provider.dots and "dot" in families:
+        segments = _dot_segments(username)
+    extras = _extra_variations(
+        username,
+        domain,
+        segments,
+        include_hyphen_underscore,
+        custom_keywords,
+        provider,
+        families,
+        keyword_prefix,
+    )
+    return username, domain, segments, extras
+
+
+def _dot_bounds(username, segments, min_dots, max_dots, max_length):
+    """Translate dot count and length limits into a range of inserted dots."""
+    existing = username.count(".")
+    low = 0
+    high = len(segments) - 1
+    if min_dots is not None:
+        low = max(low, min_dots - existing)
+    if max_dots is not None:
+        high = min(high, max_dots - existing)
+    if max_length is not None:
+        high = min(high, max_length - len(username))
+    return low, high
+
+
+def _within_limits(address, min_dots, max_dots, max_length):
+    """Check the local part of an address against the dot/length limits."""
+    local = address.rpartition("@")[0]
+    dots = local.count(".")
+    return (
+        (min_dots is None or dots >= min_dots)
+        and (max_dots is None or dots <= max_dots)
+        and (max_length is None or len(local) <= max_length)
+    )
+
+
+def _unrank_combination(n, k, rank):
+    """Return the ``rank``-th k-combination of range(n) in lexicographic order."""
+    combination = []
+    x = 0
+    for i in range(k):
+        while True:
+            block = comb(n - x - 1, k - i - 1)
+            if rank < block:
+                break
+            rank -= block
+            x += 1
+        combination.append(x)
+        x += 1
+    return combination
+
+
+def _iter_dot_combinations(segments, suffix, low, high, offset=0):
+    """Yield dot variations with ``low`` to ``high`` inserted dots.
+
+    Variations come by increasing dot count, and within a count by the
+    lexicographic order of the dotted gaps. Only the requested
+    combinations are visited, and ``offset`` is skipped arithmetically.
+    """
+    gaps = len(segments) - 1
+    for dots in range(low, high + 1):
+        size = comb(gaps, dots)
+        if offset >= size:
+            offset -= size
+            continue
+
+        combination = _unrank_combination(gaps, dots, offset)
+        offset = 0
+        while True:
+            parts = [segments[0]]
+            previous = 0
+            for gap in combination:
+                parts.append("".join(segments[previous + 1 : gap + 1]))
+                parts.append(".")
+                previous = gap
+            parts.append("".join(segments[previous + 1 :]))
+            parts.append(suffix)
+            yield "".join(parts)
+
+            # Advance to the next combination in lexicographic order
+            i = dots - 1
+            while i >= 0 and combination[i] == gaps - dots + i:
+                i -= 1
+            if i < 0:
+                break
+            combination[i] += 1
+            for j in range(i + 1, dots):
+                combination[j] = combination[j - 1] + 1
+
+
+def iter_email_variations(
+    email,
+    include_hyphen_underscore=False,
+    custom_keywords=None,
+    provider_rules=False,
+    offset=0,
+    limit=None,
+    min_dots=None,
+    max_dots=None,
+    max_length=None,
+    families=None,
+    keyword_prefix=None,
+):
+    """Yield all possible email variations lazily.
+
+    Dot variations come first in mask order, followed by the + and
+    hyphen/underscore variations. Every address is yielded exactly once
+    and memory use does not grow with the number of variations. With
+    ``provider_rules`` only the transforms the domain's provider routes
+    are applied.
+
+    The filters are applied during enumeration, so the cost follows the
+    size of the output:
+
+    - ``offset``/``limit`` skip and cap the output
+    - ``min_dots``/``max_dots`` bound the dots in the local part and
+      ``max_length`` its length; with these set the dot family is
+      emitted by increasing dot count instead of mask order
+    - ``families`` restricts output to a subset of FAMILIES
+    - ``keyword_prefix`` keeps only keywords starting with that prefix
+    """
+    validate_email(email)
+    if families is None:
+        families = FAMILIES
+    unknown = set(families) - set(FAMILIES)
+    if unknown:
+        raise ValueError(f"Unknown variation families: {sorted(unknown)}")
+
+    username, domain, segments, extras = _plan_variations(
+        email,
+        include_hyphen_underscore,
+        custom_keywords,
+        provider_rules,
+        families,
+        keyword_prefix,
+    )
+    suffix = f"@{domain}"
+    limited = min_dots is not None or max_dots is not None or max_length is not None
+    if limited:
+        extras = [
+            address
+            for address in extras
+            if _within_limits(address, min_dots, max_dots, max_length)
+        ]
+
+    # Work out which part of the dot family survives the filters
+    dot_variations = iter(())
+    if segments is not None:
+        if limited:
+            low, high = _dot_bounds(username, segments, min_dots, max_dots, max_length)
+            dot_count = sum(comb(len(segments) - 1, d) for d in range(low, high + 1))
+            if offset < dot_count:
+                dot_variations = _iter_dot_combinations(
+                    segments, suffix, low, high, offset
+                )
+        else:
+            dot_count = _dot_count(segments)
+            if offset < dot_count:
+                stop = None if limit is None else offset + limit
+                dot_variations = iter_dot_variations(username, suffix, offset, stop)
+        offset = max(offset - dot_count, 0)
+
+    variations = chain(dot_variations, extras[offset:])
+    if limit is not None:
+        variations = islice(variations, limit)
+    yield from variations
+
+
+def iter_sorted_email_variations(
+    email,
+    include_hyphen_underscore=False,
+    custom_keywords=None,
+    provider_rules=False,
+):
+    """Yield the variations of iter_email_variations in sorted order.
+
+    No dot variation is a prefix of another with the same letters, so
+    the sorted prefix table crossed with the sorted suffix table is
+    already in lexicographic order. The few other variations are merged
+    in as the blocks go by, so nothing is buffered or sorted globally.
+    """
+    validate_email(email)
+
+    username, domain, segments, extras = _plan_variations(
+        email, include_hyphen_underscore, custom_keywords, provider_rules
+    )
+    extras = sorted(extras)
+    pos = 0
+    if segments is not None:
+        prefixes, suffixes = _dot_halves(segments, f"@{domain}")
+        suffixes = sorted(suffixes)
+        for head in sorted(prefixes):
+            # Only blocks that an extra falls into need the slow merge
+            if pos < len(extras) and extras[pos] < head + suffixes[-1]:
+                for tail in suffixes:
+                    address = head + tail
+                    while pos < len(extras) and extras[pos] < address:
+                        yield extras[pos]
+                        pos += 1
+                    yield address
+            else:
+                for tail in suffixes:
+                    yield head + tail
+    yield from extras[pos:]
+
+
+def iter_email_variation_chunks(
+    email,
+    include_hyphen_underscore=False,
+    custom_keywords=None,
+    provider_rules=False,
+    offset=0,
+    limit=None,
+    chunk_size=DEFAULT_SHARD_SIZE,
+):
+    """Yield the output of iter_email_variations as UTF-8 bytes chunks.
+
+    Each chunk holds newline-terminated addresses, ready to be written to
+    a file or pipe. The ``@domain`` suffix is encoded once and no str is
+    built per address. ``offset``/``limit`` behave as in
+    iter_email_variations.
+    """
+    validate_email(email)
+
+    username, domain, segments, extras = _plan_variations(
+        email, include_hyphen_underscore, custom_keywords, provider_rules
+    )
+    dot_count = _dot_count(segments)
+    stop = None if limit is None else offset + limit
+    if offset < dot_count:
+        yield from iter_dot_variation_chunks(
+            username, f"@{domain}", offset, stop, chunk_size
+        )
+
+    extras = extras[max(offset - dot_count, 0) :]
+    if stop is not None:
+        extras = extras[: max(stop - max(offset, dot_count), 0)]
+    if extras:
+        yield ("\n".join(extras) + "\n").encode("utf-8")
+
+
+def count_email_variations(
+    email,
+    include_hyphen_underscore=False,
+    custom_keywords=None,
+    provider_rules=False,
+):
+    """Count the unique email variations without generating them.
+
+    Returns 0 for an invalid email address.
+    """
+    if not is_valid_email(email):
+        return 0
+
+    username, domain, segments, extras = _plan_variations(
+        email, include_hyphen_underscore, custom_keywords, provider_rules
+    )
+    return _dot_count(segments) + len(extras)
+
+
+def _dot_shard(username, suffix, start, stop):
+    """Generate one contiguous shard of dot variations in a worker.
+
+    The shard comes back as one bytes object, which is pickled as a plain
+    copy, so the parent does no per-address work.
+    """
+    return b"".join(iter_dot_variation_chunks(username, suffix, start, stop))
+
+
+def _write_dot_shard(username, suffix, start, stop, path):
+    """Write one contiguous shard of dot variations to its own file."""
+    with open(path, "wb") as f:
+        for chunk in iter_dot_variation_chunks(username, suffix, start, stop):
+            f.write(chunk)
+    return path
+
+
+def _dots_below(count):
+    """Total number of dots over the masks ``0``..``count - 1``."""
+    total = 0
+    bit = 0
+    while 1 << bit < count:
+        period = 2 << bit
+        total += (count // period << bit) + max(count % period - (1 << bit), 0)
+        bit += 1
+    return total
+
+
+def _dot_shard_offset(username, suffix, start):
+    """Byte offset of mask ``start`` in the newline-terminated dot output.
+
+    Every line is the username, its extra dots, the suffix and a newline,
+    so the offset is known without generating anything.
+    """
+    line = len(username.encode("utf-8")) + len(suffix.encode("utf-8")) + 1
+    return start * line + _dots_below(start)
+
+
+def _write_dot_shard_at(username, suffix, start, stop, path):
+    """Write one contiguous shard of dot variations in place in a file.
+
+    The file must already exist at its full size; each worker opens it on
+    its own and writes the shard at its precomputed offset, so workers
+    fill one output file side by side without the parent ever seeing the
+    bytes.
+    """
+    with open(path, "r+b") as f:
+        f.seek(_dot_shard_offset(username, suffix, start))
+        for chunk in iter_dot_variation_chunks(username, suffix, start, stop):
+            f.write(chunk)
+        return f.tell()
+
+
+def _iter_shards(pool, workers, username, suffix, dot_count, shard_size):
+    """Yield the dot variation shards generated by ``pool``, in order.
+
+    Only ``2 * workers`` shards are in flight at once, so memory stays
+    bounded however large the address.
+    """
+    pending = deque()
+    for start in range(0, dot_count, shard_size):
+        pending.append(
+            pool.submit(_dot_shard, username, suffix, start, start + shard_size)
+        )
+        if len(pending) >= 2 * workers:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def iter_email_variation_chunks_parallel(
+    email,
+    include_hyphen_underscore=False,
+    custom_keywords=None,
+    workers=None,
+    shard_size=DEFAULT_SHARD_SIZE,
+    provider_rules=False,
+):
+    """Yield the same bytes as iter_email_variation_chunks using processes.
+
+    The dot mask range is split into contiguous shards that are generated
+    by a process pool and yielded back in order, one bytes chunk per
+    shard.
+    """
+    validate_email(email)
+
+    username, domain, segments, extras = _plan_variations(
+        email, include_hyphen_underscore, custom_keywords, provider_rules
+    )
+    dot_count = _dot_count(segments)
+    suffix = f"@{domain}"
+
+    if dot_count <= shard_size:
+        # Not worth the process start-up cost
+        if segments is not None:
+            yield from iter_dot_variation_chunks(username, suffix)
+    else:
+        workers = workers or os.cpu_count() or 1
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            yield from _iter_shards(
+                pool, workers, username, suffix, dot_count, shard_size
+            )
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    if extras:
+        yield ("\n".join(extras) + "\n").encode("utf-8")
+
+
+def write_variations_sharded(
+    email,
+    directory,
+    include_hyphen_underscore=False,
+    custom_keywords=None,
+    workers=None,
+    shard_size=DEFAULT_SHARD_SIZE,
+    provider_rules=False,
+):
+    """Write the variations to one file per shard, generated in parallel.
+
+    Each worker writes its own shard file, so nothing is sent back to the
+    parent process. Returns the file paths in variation order.
+    """
+    validate_email(email)
+
+    username, domain, segments, extras = _plan_variations(
+        email, include_hyphen_underscore, custom_keywords, provider_rules
+    )
+    dot_count = _dot_count(segments)
+    suffix = f"@{domain}"
+    os.makedirs(directory, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                _write_dot_shard,
+                username,
+                suffix,
+                start,
+                start + shard_size,
+                os.path.join(directory, f"shard_{i:05d}.txt"),
+            )
+            for i, start in enumerate(range(0, dot_count, shard_size))
+        ]
+        paths = [future.result() for future in futures]
+
+    # The + and hyphen/underscore variations go into a final small shard
+    if extras:
+        path = os.path.join(directory, f"shard_{len(paths):05d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(extras) + "\n")
+        paths.append(path)
+
+    return paths
+
+
+def _write_dot_shards(path, username, suffix, dot_count, workers, shard_size):
+    """Fill an existing file with every dot variation using processes.
+
+    The file is sized up front and each worker writes its shard in place,
+    so the output never passes through the parent. Returns the number of
+    bytes written.
+    """
+    size = _dot_shard_offset(username, suffix, dot_count)
+    os.truncate(path, size)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                _write_dot_shard_at, username, suffix, start, start + shard_size, path
+            )
+            for start in range(0, dot_count, shard_size)
+        ]
+        for future in futures:
+            future.result()
+    return size
+
+
+class VariationSpace(Sequence):
+    """Random-access view over every variation of an email address.
+
+    Index ``i`` below ``dot_count`` is the dot variation whose mask is
+    ``i`` (bit ``b`` = dot in the ``b``-th usable gap); the remaining
+    indexes are the + and hyphen/underscore variations. The order is the
+    same as iter_email_variations (including ``provider_rules``), and
+    lookups never enumerate.
+    """
+
+    def __init__(
+        self,
+        email,
+        include_hyphen_underscore=False,
+        custom_keywords=None,
+        provider_rules=False,
+    ):
+        validate_email(email)
+
+        self.email = email
+        self.username, self.domain, self._segments, self._extras = _plan_variations(
+            email, include_hyphen_underscore, custom_keywords, provider_rules
+        )
+        self._suffix = f"@{self.domain}"
+        self.dot_count = _dot_count(self._segments)
+        self.size = self.dot_count + len(self._extras)
+        self._extra_index = {address: i for i, address in enumerate(self._extras)}
+        self._tables = None
+        if self.dot_count and len(self._segments) - 1 <= DOT_TABLE_CACHE_GAPS:
+            self._tables = _dot_tables(self._segments)
+            self._split = len(self._tables[0]).bit_length() - 1
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._unrank(i) for i in range(self.size)[index]]
+
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("variation index out of range")
+        return self._unrank(index)
+
+    def __iter__(self):
+        if self._segments is not None:
+            yield from iter_dot_variations(self.username, self._suffix)
+        yield from self._extras
+
+    def __contains__(self, address):
+        return self._rank(address) is not None
+
+    def __repr__(self):
+        return f"VariationSpace({self.email!r}, size={self.size})"
+
+    def index(self, address):
+        """Return the position of an address in the space."""
+        rank = self._rank(address)
+        if rank is None:
+            raise ValueError(f"{address!r} is not a variation of {self.email!r}")
+        return rank
+
+    def _unrank(self, index):
+        """Build the variation at a valid index."""
+        if index >= self.dot_count:
+            return self._extras[index - self.dot_count]
+
+        # Small usernames join one prefix and one suffix from the tables
+        if self._tables is not None:
+            prefixes, suffixes = self._tables
+            low = index & (len(prefixes) - 1)
+            high = index >> self._split
+            return prefixes[low] + suffixes[high] + self._suffix
+
+        segments = self._segments
+        parts = [segments[0]]
+        for bit, segment in enumerate(segments[1:]):
+            if (index >> bit) & 1:
+                parts.append(".")
+            parts.append(segment)
+        parts.append(self._suffix)
+        return "".join(parts)
+
+    def _rank(self, address):
+        """Find the index of an address, or None if it is not in the space."""
+        if address in self._extra_index:
+            return self.dot_count + self._extra_index[address]
+        if not isinstance(address, str) or not address.endswith(self._suffix):
+            return None
+        return _dot_mask(address[: -len(self._suffix)], self._segments)
+
+    def sorted_ranks(self):
+        """Yield every index of the space in sorted order of the addresses.
+
+        Uses the same prefix/suffix ordering as iter_sorted_email_variations,
+        without building the addresses themselves.
+        """
+        extras = sorted(range(len(self._extras)), key=self._extras.__getitem__)
+        pos = 0
+        if self._segments is not None:
+            prefixes, suffixes = _dot_halves(self._segments, self._suffix)
+            width = len(prefixes)
+            highs = sorted(range(len(suffixes)), key=suffixes.__getitem__)
+            bases = [high * width for high in highs]
+            last = suffixes[highs[-1]]
+            for low in sorted(range(width), key=prefixes.__getitem__):
+                head = prefixes[low]
+                if pos < len(extras) and self._extras[extras[pos]] < head + last:
+                    for high, base in zip(highs, bases):
+                        address = head + suffixes[high]
+                        while pos < len(extras) and self._extras[extras[pos]] < address:
+                            yield self.dot_count + extras[pos]
+                            pos += 1
+                        yield base + low
+                else:
+                    for base in bases:
+                        yield base + low
+        for i in extras[pos:]:
+            yield self.dot_count + i
+
+
+class VariationSet(Sequence):
+    """Compact collection of variations from one VariationSpace.
+
+    Only the indexes into the space are stored, 8 bytes per entry in an
+    ``array('Q')``; the addresses are built when they are accessed. The
+    entries keep the order they were added in.
+    """
+
+    def __init__(self, space, ranks=()):
+        self.space = space
+        self.ranks = array("Q", ranks)
+        self._ascending = all(a < b for a, b in zip(self.ranks, self.ranks[1:]))
+        self._lookup = None
+
+    def __len__(self):
+        return len(self.ranks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return VariationSet(self.space, self.ranks[index])
+        return self.space._unrank(self.ranks[index])
+
+    def __iter__(self):
+        return map(self.space._unrank, self.ranks)
+
+    def __contains__(self, address):
+        rank = self.space._rank(address)
+        if rank is None:
+            return False
+        if self._ascending:
+            ranks = self.ranks
+        else:
+            # Keep a sorted copy for membership tests, rebuilt after extend()
+            if self._lookup is None:
+                self._lookup = array("Q", sorted(self.ranks))
+            ranks = self._lookup
+        position = bisect_left(ranks, rank)
+        return position < len(ranks) and ranks[position] == rank
+
+    def __repr__(self):
+        return f"VariationSet({self.space.email!r}, len={len(self)})"
+
+    def index(self, address):
+        """Return the position of an address in the set."""
+        if address in self:
+            rank = self.space._rank(address)
+            if self._ascending:
+                return bisect_left(self.ranks, rank)
+            return self.ranks.index(rank)
+        raise ValueError(f"{address!r} is not in the set")
+
+    def add(self, address):
+        """Add a variation of the space if it is not in the set yet."""
+        if address not in self:
+            self.extend([self.space.index(address)])
+
+    def extend(self, ranks):
+        """Append indexes of the space, or the entries of another set."""
+        if isinstance(ranks, VariationSet):
+            ranks = ranks.ranks
+        start = len(self.ranks)
+        self.ranks.extend(ranks)
+        if self._ascending:
+            previous = self.ranks[start - 1 : start] if start else array("Q")
+            new = previous + self.ranks[start:]
+            self._ascending = all(a < b for a, b in zip(new, new[1:]))
+        self._lookup = None
+
+
+def iter_variation_batches(
+    email,
+    include_hyphen_underscore=False,
+    custom_keywords=None,
+    batch_size=PROGRESS_CHUNK_SIZE,
+    provider_rules=False,
+    ordered=False,
+    compact=False,
+):
+    """Yield the variations of iter_email_variations in lists of batch_size.
+
+    With ``ordered`` the batches follow iter_sorted_email_variations. With
+    ``compact`` each batch is a VariationSet instead of a list of strings.
+    """
+    if compact:
+        space = VariationSpace(
+            email, include_hyphen_underscore, custom_keywords, provider_rules
+        )
+        ranks = space.sorted_ranks() if ordered else iter(range(space.size))
+        while True:
+            batch = VariationSet(space, islice(ranks, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    generate = iter_sorted_email_variations if ordered else iter_email_variations
+    variations = generate(
+        email, include_hyphen_underscore, custom_keywords, provider_rules
+    )
+    while True:
+        batch = list(islice(variations, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class GenerationCancelled(Exception):
+    """Raised from a progress callback to stop generation early."""
+
+
+def _report_progress(variations, total, progress, chunk_size=PROGRESS_CHUNK_SIZE):
+    """Pass variations through, calling ``progress(done, total)`` per chunk."""
+    done = 0
+    progress(done, total)
+    variations = iter(variations)
+    while True:
+        chunk = list(islice(variations, chunk_size))
+        if not chunk:
+            return
+        yield from chunk
+        done += len(chunk)
+        progress(done, total)
+
+
 def generate_email_variations(
-    email, include_hyphen_underscore=False, custom_keywords=None
+    email,
+    include_hyphen_underscore=False,
+    custom_keywords=None,
+    progress=None,
+    provider_rules=False,
+    cache=None,
 ):
-    """Generate all possible email variations."""
+    """Generate all possible email variations in sorted order.
+
+    If given, ``progress`` is called as ``progress(done, total)`` while
+    the variations are generated; it may raise GenerationCancelled to
+    abort the run. With a VariationCache as ``cache``, repeated calls
+    are served from it.
+    """
     if not is_valid_email(email):
         return ["Invalid email format"]
 
-    # Split email into username and domain
-    username, domain = email.split("@")
+    if cache is not None:
+        variations = cache.get(
+            email, include_hyphen_underscore, custom_keywords, provider_rules
+        )
+        if progress is not None:
+            progress(len(variations), len(variations))
+        return variations
 
-    # Initialize variations list
-    variations = set()
+    variations = iter_sorted_email_variations(
+        email, include_hyphen_underscore, custom_keywords, provider_rules
+    )
+    if progress is not None:
+        total = count_email_variations(
+            email, include_hyphen_underscore, custom_keywords, provider_rules
+        )
+        variations = _report_progress(variations, total, progress)
+    return list(variations)
+
+
+def sample_email_variations(
+    email,
+    n,
+    seed=None,
+    include_hyphen_underscore=False,
+    custom_keywords=None,
+    provider_rules=False,
+):
+    """Draw ``n`` distinct variations uniformly at random, sorted.
+
+    Indexes are drawn straight from the VariationSpace with Floyd's
+    algorithm, so the cost is O(n * len(email)) however large the space
+    is. The same ``seed`` always gives the same sample.
+    """
+    if n < 0:
+        raise ValueError("Sample size must not be negative")
+    if not is_valid_email(email):
+        return ["Invalid email format"]
+
+    space = VariationSpace(
+        email, include_hyphen_underscore, custom_keywords, provider_rules
+    )
+    total = space.size
+    if n >= total:
+        return sorted(space)
+
+    rng = random.Random(seed)
+    chosen = set()
+    for j in range(total - n, total):
+        index = rng.randrange(j + 1)
+        chosen.add(j if index in chosen else index)
+    return sorted(space[index] for index in chosen)
+
+
+def _cache_size(value):
+    """Approximate memory held by a cached result, in bytes."""
+    if isinstance(value, tuple):
+        return sum(map(_cache_size, value))
+    if isinstance(value, VariationSet):
+        return sys.getsizeof(value.ranks)
+    # Counts one byte per character, exact for ASCII addresses
+    return sys.getsizeof(value) + len(value) * sys.getsizeof("") + sum(map(len, value))
+
+
+class VariationCache:
+    """LRU cache of generated results, bounded by memory use in bytes.
+
+    Results are keyed on the address and the generation options, with
+    the keywords normalized to a sorted tuple. Only results are kept
+    here; the dot tables come from the shared module-level cache. With a
+    ``directory``, results are also kept there as zlib-compressed blobs
+    that survive eviction and restarts.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Drop every in-memory entry (blobs on disk are kept)."""
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def get(
+        self,
+        email,
+        include_hyphen_underscore=False,
+        custom_keywords=None,
+        provider_rules=False,
+    ):
+        """Return the sorted variations of an address, generating on a miss."""
+        key = self._key(
+            email, include_hyphen_underscore, custom_keywords, provider_rules
+        )
+        variations = self._lookup(key)
+        if variations is not None:
+            return list(variations)
+
+        username, domain, segments, extras = _plan_variations(
+            email.strip(), include_hyphen_underscore, custom_keywords, provider_rules
+        )
+        variations = []
+        if segments is not None:
+            # The shared tables crossed in sorted order are already sorted
+            prefixes, suffixes = _dot_tables(segments)
+            suffixes = sorted(tail + f"@{domain}" for tail in suffixes)
+            variations = [head + tail for head in sorted(prefixes) for tail in suffixes]
+        # A handful of extras, each inserted into the sorted dot family
+        for address in extras:
+            insort(variations, address)
+
+        self._put(key, variations)
+        self._write_blob(key, variations)
+        return list(variations)
+
+    def lookup(
+        self,
+        email,
+        include_hyphen_underscore=False,
+        custom_keywords=None,
+        provider_rules=False,
+    ):
+        """Return a cached result from memory or disk, or None."""
+        return self._lookup(
+            self._key(email, include_hyphen_underscore, custom_keywords, provider_rules)
+        )
+
+    def _lookup(self, key):
+        """Find an entry in memory, then in the disk tier."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+        variations = self._read_blob(key)
+        if variations is not None:
+            self._put(key, variations)
+        return variations
+
+    def store(
+        self,
+        email,
+        variations,
+        include_hyphen_underscore=False,
+        custom_keywords=None,
+        provider_rules=False,
+    ):
+        """Cache a result generated elsewhere, e.g. a VariationSet."""
+        key = self._key(
+            email, include_hyphen_underscore, custom_keywords, provider_rules
+        )
+        self._put(key, variations)
+        self._write_blob(key, variations)
+
+    def _key(self, email, include_hyphen_underscore, custom_keywords, provider_rules):
+        """Normalize an address and its options into a cache key."""
+        email = email.strip()
+        validate_email(email)
+        username, domain = email.split("@")
+        keywords = tuple(sorted(set(custom_keywords or DEFAULT_KEYWORDS)))
+        return (
+            username,
+            domain,
+            keywords,
+            bool(include_hyphen_underscore),
+            bool(provider_rules),
+        )
+
+    def _put(self, key, value):
+        """Insert an entry and evict the least recently used ones."""
+        size = _cache_size(value)
+        if key in self._entries:
+            self.current_bytes -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted
+
+    def _blob_path(self, key):
+        """Path of the disk tier blob for a key."""
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".zz")
+
+    def _write_blob(self, key, variations):
+        """Save a compressed copy of a result in the disk tier, if any."""
+        if self.directory is None:
+            return
+        path = self._blob_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress("\n".join(variations).encode("utf-8")))
+        os.replace(tmp_path, path)
+
+    def _read_blob(self, key):
+        """Load a result from the disk tier, or None if it is missing."""
+        if self.directory is None:
+            return None
+        try:
+            with open(self._blob_path(key), "rb") as f:
+                text = zlib.decompress(f.read()).decode("utf-8")
+        except (OSError, zlib.error):
+            return None
+        return text.split("\n") if text else []
+
+
+def _provider_for(domain, provider_rules):
+    """Resolve the provider and mailbox domain of a (sub)domain."""
+    if not provider_rules:
+        return CUSTOM_DOMAIN, domain, None
+
+    provider = resolve_provider(domain)
+    if provider is CUSTOM_DOMAIN and "." in domain:
+        # keyword@username.fastmail.com style subdomain addressing, with the
+        # same single-label rule as generation
+        label, parent = domain.split(".", 1)
+        parent_provider = resolve_provider(parent)
+        if parent_provider.subdomain and DNS_LABEL_PATTERN.match(label):
+            return parent_provider, parent, label
+    return provider, domain, None
+
+
+def canonicalize(address, provider_rules=False):
+    """Map any generated variation back to a canonical address.
+
+    Every variation of a base address canonicalizes to the same value as
+    the base itself: the tag is cut off, dots (and for custom domains
+    hyphens and underscores) are dropped and everything is lowercased.
+    ``provider_rules`` must match the setting used for generation.
+    """
+    local, at, domain = address.strip().rpartition("@")
+    if not at or not local or not domain:
+        raise ValueError(f"Invalid email format: {address!r}")
+
+    domain = domain.lower()
+    provider, domain, subdomain_user = _provider_for(domain, provider_rules)
+    domain = CANONICAL_DOMAINS.get(domain, domain)
+    if subdomain_user is not None:
+        local = subdomain_user
+
+    local = local.lower()
+    if provider.tag_separator:
+        local = local.split(provider.tag_separator, 1)[0]
+    if provider.hyphen_underscore:
+        local = local.replace("-", ".").replace("_", ".")
+    if provider.dots:
+        local = local.replace(".", "")
+    return f"{local}@{domain}"
+
+
+class VariantIndex:
+    """Reverse lookup from any variation to the base address it came from.
+
+    Base addresses are stored under their canonical form, so a lookup is
+    one canonicalization plus a hash (or SQLite index) probe. With a
+    ``path`` the index lives in an SQLite file and survives restarts.
+    """
+
+    def __init__(self, path=None, provider_rules=False):
+        self.provider_rules = provider_rules
+        self._bases = {}
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS bases ("
+                "key TEXT NOT NULL, base TEXT NOT NULL, UNIQUE (key, base))"
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        if self._db is not None:
+            return self._db.execute("SELECT COUNT(*) FROM bases").fetchone()[0]
+        return sum(
+            1 if isinstance(bases, str) else len(bases)
+            for bases in self._bases.values()
+        )
+
+    def close(self):
+        """Commit and close the on-disk index, if any."""
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+    def add(self, base):
+        """Index a single base address; returns 1 if it was newly added."""
+        return self.add_many([base])
+
+    def add_many(self, bases):
+        """Index many base addresses; returns how many were newly added.
+
+        Invalid addresses and ones already in the index are skipped and
+        not counted.
+        """
+        pairs = (
+            (canonicalize(base, self.provider_rules), base)
+            for base in bases
+            if is_valid_email(base)
+        )
+        if self._db is not None:
+            with self._db:
+                before = self._db.total_changes
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO bases (key, base) VALUES (?, ?)", pairs
+                )
+                return self._db.total_changes - before
+
+        added = 0
+        for key, base in pairs:
+            # Keep a plain string per key and only build a list on collisions
+            existing = self._bases.get(key)
+            if existing is None:
+                self._bases[key] = base
+            elif isinstance(existing, str):
+                if existing == base:
+                    continue
+                self._bases[key] = [existing, base]
+            elif base in existing:
+                continue
+            else:
+                existing.append(base)
+            added += 1
+        return added
+
+    def lookup_all(self, address):
+        """Return every base address the variation may belong to."""
+        try:
+            key = canonicalize(address, self.provider_rules)
+        except ValueError:
+            return []
+
+        if self._db is not None:
+            rows = self._db.execute(
+                "SELECT base FROM bases WHERE key = ? ORDER BY rowid", (key,)
+            )
+            return [row[0] for row in rows]
 
-    # Add original email
-    variations.add(email)
+        bases = self._bases.get(key)
+        if bases is None:
+            return []
+        return [bases] if isinstance(bases, str) else list(bases)
 
-    # Generate dot variations (Gmail-compatible)
-    dot_variations = generate_dot_variations(username)
-    for dot_var in dot_variations:
-        variations.add(f"{dot_var}@{domain}")
+    def lookup(self, address):
+        """Return the base address of a variation, or None if unknown."""
+        bases = self.lookup_all(address)
+        return bases[0] if bases else None
 
-    # Generate +something variations
-    plus_variations = generate_plus_variations(username, custom_keywords)
-    for plus_var in plus_variations:
-        variations.add(f"{plus_var}@{domain}")
+    def classify(self, addresses):
+        """Yield ``(address, base)`` pairs, with None for unknown addresses."""
+        for address in addresses:
+            yield address, self.lookup(address)
 
-    # Generate hyphen/underscore variations (optional)
-    if include_hyphen_underscore:
-        hyphen_underscore_variations = generate_hyphen_underscore_variations(username)
-        for var in hyphen_underscore_variations:
-            variations.add(f"{var}@{domain}")
+    def classify_file(self, source, output):
+        """Classify a file of addresses into ``address<TAB>base`` lines.
 
-    return sorted(list(variations))
+        ``source`` is a path or "-" for stdin and ``output`` a text file
+        object. Returns ``(total, matched)``.
+        """
+        counts = [0, 0]
+
+        def rows():
+            for address, base in self.classify(iter_addresses(source)):
+                counts[0] += 1
+                if base is not None:
+                    counts[1] += 1
+                yield f"{address}\t{base or ''}"
+
+        write_lines(output, rows())
+        return counts[0], counts[1]
+
+
+def _dedupe_key(address, provider_rules):
+    """Canonical grouping key, or the address itself if it cannot be parsed."""
+    try:
+        return canonicalize(address, provider_rules)
+    except ValueError:
+        return address
+
+
+def _partition_of(key, level, partitions):
+    """Hash partition of a grouping key, with a different hash per level."""
+    digest = hashlib.blake2b(
+        key.encode("utf-8"), digest_size=8, salt=level.to_bytes(16, "little")
+    ).digest()
+    return int.from_bytes(digest, "little") % partitions
+
+
+def _spill_groups(groups, files, level):
+    """Append in-memory groups to their hash partition files."""
+    for key, (representative, count) in groups.items():
+        files[_partition_of(key, level, len(files))].write(
+            f"{count}\t{representative}\n"
+        )
+    groups.clear()
+
+
+def _read_partition(path):
+    """Yield the ``(representative, count)`` entries of a spilled partition."""
+    with open(path, encoding="utf-8") as part:
+        for line in part:
+            count, representative = line.rstrip("\n").split("\t", 1)
+            yield representative, int(count)
+
+
+def _group_entries(entries, provider_rules, max_groups, partitions, spill_dir, level):
+    """Group ``(address, count)`` entries, spilling past ``max_groups`` groups.
+
+    A spilled partition is grouped by a recursive call with the next hash
+    level, so one that still holds too many groups is split again and
+    memory stays bounded by ``max_groups`` whatever the input size.
+    """
+    groups = {}
+    files = None
+    for address, count in entries:
+        key = _dedupe_key(address, provider_rules)
+        group = groups.get(key)
+        if group is not None:
+            group[1] += count
+            continue
+
+        groups[key] = [address, count]
+        if len(groups) > max_groups:
+            if files is None:
+                directory = tempfile.mkdtemp(dir=spill_dir)
+                files = [
+                    open(
+                        os.path.join(directory, f"part_{i:04d}.txt"),
+                        "w",
+                        encoding="utf-8",
+                    )
+                    for i in range(partitions)
+                ]
+            _spill_groups(groups, files, level)
+
+    if files is None:
+        for representative, count in groups.values():
+            yield representative, count
+        return
+
+    _spill_groups(groups, files, level)
+    for f in files:
+        f.close()
+
+    # Every group now lives in exactly one partition, in input order
+    for f in files:
+        yield from _group_entries(
+            _read_partition(f.name),
+            provider_rules,
+            max_groups,
+            partitions,
+            spill_dir,
+            level + 1,
+        )
+        os.remove(f.name)
+
+
+def dedupe_addresses(
+    addresses,
+    provider_rules=True,
+    max_groups=DEFAULT_DEDUPE_GROUPS,
+    partitions=DEFAULT_DEDUPE_PARTITIONS,
+    tmpdir=None,
+):
+    """Collapse variant-equivalent addresses into one entry per account.
+
+    Addresses are grouped by their canonical form and ``(representative,
+    count)`` pairs are yielded, the representative being the first
+    address seen for the group. Groups are kept in memory until there are
+    more than ``max_groups`` of them; after that everything is hash
+    partitioned into temporary files that are grouped one at a time, and
+    partitions that are still too large are split again.
+
+    Each domain's provider rules decide which addresses share a mailbox,
+    so ``j.smith@outlook.com`` and ``jsmith@outlook.com`` stay apart. With
+    ``provider_rules=False`` every domain is folded like a catch-all
+    custom domain instead.
+    """
+    # Fewer could never split a partition that is still too large
+    if max_groups < 1 or partitions < 2:
+        raise ValueError("max_groups must be at least 1 and partitions at least 2")
+
+    with tempfile.TemporaryDirectory(dir=tmpdir) as spill_dir:
+        yield from _group_entries(
+            ((address, 1) for address in addresses),
+            provider_rules,
+            max_groups,
+            partitions,
+            spill_dir,
+            0,
+        )
+
+
+def _open_output(path, compression):
+    """Open a binary output file, compressed according to ``compression``."""
+    if compression is None:
+        return open(path, "xb", buffering=OUTPUT_BUFFER_SIZE)
+    if compression == "gzip":
+        return gzip.open(path, "xb", compresslevel=6)
+    if compression == "bz2":
+        return bz2.open(path, "xb")
+    if compression == "xz":
+        return lzma.open(path, "xb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        return zstandard.open(path, "xb")
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def write_variations(
+    variations, filename, compression=None, chunk_size=WRITE_CHUNK_SIZE
+):
+    """Write variations to a file in bulk and replace it atomically.
+
+    Any iterable of strings is accepted and written in large joined
+    chunks to a temporary file next to ``filename``, which is renamed
+    into place once complete. ``compression`` is one of "gzip", "bz2",
+    "xz" or "zstd"; by default it is inferred from the file extension.
+
+    Returns a dict with the line and byte counts, elapsed seconds and
+    the write throughput in bytes per second.
+    """
+    if compression is None:
+        compression = COMPRESSION_SUFFIXES.get(os.path.splitext(filename)[1])
+
+    started = time.perf_counter()
+    lines = 0
+    size = 0
+    tmp_path = f"{filename}.{os.getpid()}.tmp"
+    try:
+        with _open_output(tmp_path, compression) as f:
+            variations = iter(variations)
+            while True:
+                chunk = list(islice(variations, chunk_size))
+                if not chunk:
+                    break
+                data = ("\n".join(chunk) + "\n").encode("utf-8")
+                f.write(data)
+                lines += len(chunk)
+                size += len(data)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    seconds = time.perf_counter() - started
+    return {
+        "filename": filename,
+        "lines": lines,
+        "bytes": size,
+        "seconds": seconds,
+        "bytes_per_second": size / seconds if seconds else float("inf"),
+    }
+
+
+def _write_fd(fd, data):
+    """Write all of ``data`` to a file descriptor, resuming short writes."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view) :]
+
+
+def write_chunks(chunks, fd, buffer_size=OUTPUT_BUFFER_SIZE):
+    """Write bytes chunks to a file descriptor in large blocks.
+
+    Small chunks are gathered in one reusable bytearray and flushed with
+    a single ``os.write`` once ``buffer_size`` bytes are pending; chunks
+    at least that large go out directly. Returns the number of bytes.
+    """
+    buffer = bytearray()
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        if len(chunk) >= buffer_size:
+            if buffer:
+                _write_fd(fd, buffer)
+                buffer.clear()
+            _write_fd(fd, chunk)
+            continue
+        buffer += chunk
+        if len(buffer) >= buffer_size:
+            _write_fd(fd, buffer)
+            buffer.clear()
+    if buffer:
+        _write_fd(fd, buffer)
+    return size
+
+
+def _write_parallel(
+    path, fd, email, include_hyphen_underscore, custom_keywords, workers, provider_rules
+):
+    """Write an address's plain output to ``fd`` (open on ``path``) in parallel.
+
+    The dot variations are written in place by the worker processes and
+    the + and hyphen/underscore variations are appended after them.
+    Returns the number of bytes.
+    """
+    validate_email(email)
+    username, domain, segments, extras = _plan_variations(
+        email, include_hyphen_underscore, custom_keywords, provider_rules
+    )
+    size = _write_dot_shards(
+        path,
+        username,
+        f"@{domain}",
+        _dot_count(segments),
+        workers,
+        DEFAULT_SHARD_SIZE,
+    )
+    if extras:
+        os.lseek(fd, size, os.SEEK_SET)
+        size += write_chunks([("\n".join(extras) + "\n").encode("utf-8")], fd)
+    return size
+
+
+def write_email_variations(
+    email,
+    filename,
+    include_hyphen_underscore=False,
+    custom_keywords=None,
+    provider_rules=False,
+    compression=None,
+    offset=0,
+    limit=None,
+    workers=None,
+):
+    """Generate an address's variations straight into a file as bytes.
+
+    Same output and atomic replace as ``write_variations(
+    iter_email_variations(...), filename)``, but the bytes come from
+    iter_email_variation_chunks, with no str per address. ``workers`` > 1
+    generates the whole output with a process pool instead; uncompressed
+    files are then written in place by the workers. Returns the same
+    statistics dict.
+    """
+    if compression is None:
+        compression = COMPRESSION_SUFFIXES.get(os.path.splitext(filename)[1])
+
+    started = time.perf_counter()
+    parallel = workers and workers > 1 and not offset and limit is None
+    if parallel:
+        # Plain files are filled in place by the workers; compressed output
+        # has to stream through this process
+        chunks = iter_email_variation_chunks_parallel(
+            email,
+            include_hyphen_underscore,
+            custom_keywords,
+            workers,
+            provider_rules=provider_rules,
+        )
+    else:
+        chunks = iter_email_variation_chunks(
+            email,
+            include_hyphen_underscore,
+            custom_keywords,
+            provider_rules,
+            offset,
+            limit,
+        )
+    total = count_email_variations(
+        email, include_hyphen_underscore, custom_keywords, provider_rules
+    )
+    lines = max(min(total - offset, total if limit is None else limit), 0)
+
+    tmp_path = f"{filename}.{os.getpid()}.tmp"
+    try:
+        if compression is None:
+            # O_BINARY keeps Windows from turning "\n" into "\r\n"
+            flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+            fd = os.open(tmp_path, flags, 0o666)
+            try:
+                if parallel:
+                    size = _write_parallel(
+                        tmp_path,
+                        fd,
+                        email,
+                        include_hyphen_underscore,
+                        custom_keywords,
+                        workers,
+                        provider_rules,
+                    )
+                else:
+                    size = write_chunks(chunks, fd)
+            finally:
+                os.close(fd)
+        else:
+            size = 0
+            with _open_output(tmp_path, compression) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    seconds = time.perf_counter() - started
+    return {
+        "filename": filename,
+        "lines": lines,
+        "bytes": size,
+        "seconds": seconds,
+        "bytes_per_second": size / seconds if seconds else float("inf"),
+    }
 
 
 def save_variations_to_file(variations, filename="email_variations.txt"):
     """Save the variations to a file."""
-    with open(filename, "w", encoding="utf-8") as f:
-        for variation in variations:
-            f.write(variation + "\n")
+    write_variations(variations, filename)
     return filename
 
 
-def main():
+def write_lines(f, lines, chunk_size=WRITE_CHUNK_SIZE):
+    """Stream lines to a text file object in large joined chunks."""
+    lines = iter(lines)
+    count = 0
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            return count
+        f.write("\n".join(chunk))
+        f.write("\n")
+        count += len(chunk)
+
+
+def numbered_lines(variations):
+    """Yield the numbered text format with its header and total footer."""
+    yield NUMBERED_HEADER
+    yield "=" * 30
+    yield ""
+    count = 0
+    for count, variation in enumerate(variations, 1):
+        yield f"{count:3d}. {variation}"
+    yield ""
+    yield f"Total: {count} variations"
+
+
+def write_indexed_variations(variations, filename, chunk_size=WRITE_CHUNK_SIZE):
+    """Write variations as a data file plus an offset index for random access.
+
+    The data file holds one address per line, as in the plain format. The
+    index next to it (``filename + ".idx"``) holds the byte offset of every
+    line plus the end of the data as little-endian uint64s, so line ``i``
+    can be found without scanning. Both files are replaced atomically.
+
+    Returns the same statistics as write_variations.
+    """
+    index_name = filename + INDEX_SUFFIX
+    started = time.perf_counter()
+    lines = 0
+    size = 0
+    tmp_path = f"{filename}.{os.getpid()}.tmp"
+    tmp_index = f"{index_name}.{os.getpid()}.tmp"
+    try:
+        with (
+            open(tmp_path, "xb", buffering=OUTPUT_BUFFER_SIZE) as f,
+            open(tmp_index, "xb", buffering=OUTPUT_BUFFER_SIZE) as index,
+        ):
+            index.write(struct.pack("<Q", 0))
+            variations = iter(variations)
+            while True:
+                chunk = list(islice(variations, chunk_size))
+                if not chunk:
+                    break
+                data = ("\n".join(chunk) + "\n").encode("utf-8")
+                lengths = [len(line) + 1 for line in chunk]
+                if sum(lengths) != len(data):
+                    # Non-ASCII lines take more bytes than characters
+                    lengths = [len(line.encode("utf-8")) + 1 for line in chunk]
+                offsets = array("Q", islice(accumulate(lengths, initial=size), 1, None))
+                if sys.byteorder == "big":
+                    offsets.byteswap()
+                f.write(data)
+                index.write(offsets.tobytes())
+                lines += len(chunk)
+                size += len(data)
+        os.replace(tmp_path, filename)
+        os.replace(tmp_index, index_name)
+    except BaseException:
+        for path in (tmp_path, tmp_index):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    seconds = time.perf_counter() - started
+    return {
+        "filename": filename,
+        "lines": lines,
+        "bytes": size,
+        "seconds": seconds,
+        "bytes_per_second": size / seconds if seconds else float("inf"),
+    }
+
+
+def _map_file(path):
+    """Memory-map a whole file read-only (empty files map to b"")."""
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class IndexedVariations(Sequence):
+    """Read-only random access to a file from write_indexed_variations.
+
+    Both files are memory-mapped, so opening is instant and ``[i]`` costs
+    two index reads and one slice, however large the file is.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._data = _map_file(filename)
+        self._index = _map_file(filename + INDEX_SUFFIX)
+        entries = len(self._index) // 8
+        if (
+            len(self._index) % 8
+            or not entries
+            or struct.unpack_from("<Q", self._index, (entries - 1) * 8)[0]
+            != len(self._data)
+        ):
+            self.close()
+            raise ValueError(f"{filename} does not match its index")
+        self._size = entries - 1
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(self._size)[index]]
+
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("variation index out of range")
+        start, end = struct.unpack_from("<2Q", self._index, index * 8)
+        return self._data[start : end - 1].decode("utf-8")
+
+    def __iter__(self):
+        with open(self.filename, encoding="utf-8", newline="\n") as f:
+            for line in f:
+                yield line[:-1]
+
+    def __repr__(self):
+        return f"IndexedVariations({self.filename!r}, len={self._size})"
+
+    def close(self):
+        for mapped in (self._data, self._index):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_saved_variations(source):
+    """Stream the addresses of a plain or numbered text output file.
+
+    The numbered format's header, "  N. " prefixes and total footer are
+    dropped, so either format gives back just the addresses.
+    """
+    for line in iter_addresses(source):
+        match = NUMBERED_LINE.match(line)
+        if match:
+            yield match.group(1)
+        elif not (
+            line == NUMBERED_HEADER
+            or set(line) == {"="}
+            or (line.startswith("Total: ") and line.endswith(" variations"))
+        ):
+            yield line
+
+
+def convert_to_indexed(source, filename):
+    """Convert a plain or numbered text output file to the indexed format."""
+    return write_indexed_variations(iter_saved_variations(source), filename)
+
+
+def parse_keywords(text):
+    """Parse a comma-separated keyword string, or None for the defaults.
+
+    Empty entries, e.g. from a trailing comma, are dropped.
+    """
+    keywords = [k.strip() for k in text.split(",") if k.strip()]
+    return keywords or None
+
+
+def iter_addresses(source):
+    """Stream one address per line from a file path, or stdin for "-"."""
+    if source == "-":
+        lines = sys.stdin
+    else:
+        lines = open(source, encoding="utf-8")
+    try:
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield line
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+
+def read_addresses(source):
+    """Read one address per line from a file path, or stdin for "-"."""
+    return list(iter_addresses(source))
+
+
+def _batch_job(email, include_hyphen_underscore, custom_keywords, provider_rules, path):
+    """Write the variations of one batch address to its own file."""
+    stats = write_email_variations(
+        email, path, include_hyphen_underscore, custom_keywords, provider_rules
+    )
+    return stats["lines"]
+
+
+def _batch_chunks(
+    email, include_hyphen_underscore, custom_keywords, provider_rules, pool, workers
+):
+    """Yield one batch address's variations as bytes chunks.
+
+    With a ``pool``, addresses large enough to be split into shards are
+    generated by its workers; the rest are generated here.
+    """
+    username, domain, segments, extras = _plan_variations(
+        email, include_hyphen_underscore, custom_keywords, provider_rules
+    )
+    dot_count = _dot_count(segments)
+    suffix = f"@{domain}"
+    if pool is not None and dot_count > DEFAULT_SHARD_SIZE:
+        yield from _iter_shards(
+            pool, workers, username, suffix, dot_count, DEFAULT_SHARD_SIZE
+        )
+    elif segments is not None:
+        yield from iter_dot_variation_chunks(username, suffix)
+    if extras:
+        yield ("\n".join(extras) + "\n").encode("utf-8")
+
+
+def _write_stream_chunks(output, chunks):
+    """Write bytes chunks to a text stream, through its buffer when it has one."""
+    buffer = getattr(output, "buffer", None)
+    if buffer is None:
+        for chunk in chunks:
+            output.write(chunk.decode("utf-8"))
+        return
+    output.flush()
+    for chunk in chunks:
+        buffer.write(chunk)
+
+
+def generate_batch(
+    emails,
+    output=None,
+    output_dir=None,
+    include_hyphen_underscore=False,
+    custom_keywords=None,
+    workers=None,
+    provider_rules=False,
+):
+    """Generate variations for many addresses in a single run.
+
+    Addresses are deduplicated and validated first. With ``output_dir``
+    every address gets its own ``<address>.txt`` file, otherwise all
+    variations are streamed to the ``output`` text stream (stdout by
+    default). ``workers`` > 1 spreads the files over a process pool, or
+    the shards of large addresses for combined output.
+
+    Returns a summary dict with counts and timing, where ``invalid``
+    lists the rejected addresses as ``(address, reason)`` pairs.
+    """
+    started = time.perf_counter()
+    emails = list(emails)
+    unique = list(dict.fromkeys(emails))
+    valid, invalid = validate_many(unique)
+
+    parallel = workers and workers > 1
+    total = 0
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        args = (
+            valid,
+            [include_hyphen_underscore] * len(valid),
+            [custom_keywords] * len(valid),
+            [provider_rules] * len(valid),
+            [os.path.join(output_dir, f"{email}.txt") for email in valid],
+        )
+        if parallel:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                total = sum(pool.map(_batch_job, *args, chunksize=16))
+        else:
+            total = sum(map(_batch_job, *args))
+    else:
+        # Combined output is streamed address by address as bytes, so no
+        # address's result is ever held whole
+        if output is None:
+            output = sys.stdout
+        pool = ProcessPoolExecutor(max_workers=workers) if parallel else None
+        try:
+            for email in valid:
+                options = (include_hyphen_underscore, custom_keywords, provider_rules)
+                _write_stream_chunks(
+                    output, _batch_chunks(email, *options, pool, workers)
+                )
+                total += count_email_variations(email, *options)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    return {
+        "addresses": len(emails),
+        "duplicates": len(emails) - len(unique),
+        "invalid": invalid,
+        "generated": len(valid),
+        "variations": total,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def _run_batch(args):
+    """Run the --batch CLI mode and print a summary to stderr."""
+    try:
+        emails = read_addresses(args.batch)
+    except OSError as e:
+        print(f"error: cannot read {args.batch}: {e}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+
+    output = None
+    if args.output and not args.output_dir:
+        output = open(args.output, "w", encoding="utf-8", buffering=OUTPUT_BUFFER_SIZE)
+    try:
+        summary = generate_batch(
+            emails,
+            output=output,
+            output_dir=args.output_dir,
+            include_hyphen_underscore=args.hyphen_underscore,
+            custom_keywords=parse_keywords(args.keywords),
+            workers=args.workers,
+            provider_rules=args.provider_rules,
+        )
+    finally:
+        if output is not None:
+            output.close()
+
+    print(
+        f"Processed {summary['addresses']} addresses "
+        f"({summary['duplicates']} duplicates, {len(summary['invalid'])} invalid): "
+        f"{summary['variations']} variations in {summary['seconds']:.2f}s",
+        file=sys.stderr,
+    )
+    for email, reason in summary["invalid"]:
+        print(f"Invalid email format: {email} ({reason})", file=sys.stderr)
+    return EXIT_OK
+
+
+def _run_single(args):
+    """Stream the variations of one address to stdout or a file."""
+    email = args.email.strip()
+    reason = email_error(email)
+    if reason is not None:
+        print(f"error: invalid email format: {email} ({reason})", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+
+    # Plain unfiltered output is written as bytes without building strings
+    filtered = (
+        args.min_dots,
+        args.max_dots,
+        args.max_length,
+        args.families,
+        args.keyword_prefix,
+    )
+    if (
+        args.sample is None
+        and args.format == "plain"
+        and all(f is None for f in filtered)
+    ):
+        return _run_single_bytes(email, args)
+
+    if args.sample is not None:
+        variations = sample_email_variations(
+            email,
+            args.sample,
+            args.seed,
+            args.hyphen_underscore,
+            parse_keywords(args.keywords),
+            args.provider_rules,
+        )
+        if args.limit is not None:
+            variations = islice(variations, args.limit)
+    else:
+        variations = iter_email_variations(
+            email,
+            args.hyphen_underscore,
+            parse_keywords(args.keywords),
+            args.provider_rules,
+            offset=args.offset,
+            limit=args.limit,
+            min_dots=args.min_dots,
+            max_dots=args.max_dots,
+            max_length=args.max_length,
+            families=args.families,
+            keyword_prefix=args.keyword_prefix,
+        )
+    if args.format == "numbered":
+        variations = numbered_lines(variations)
+
+    if not args.output:
+        write_lines(sys.stdout, variations)
+        sys.stdout.flush()
+        return EXIT_OK
+
+    if args.format == "indexed":
+        stats = write_indexed_variations(variations, args.output)
+    else:
+        stats = write_variations(variations, args.output)
+    print(
+        f"Wrote {stats['lines']} lines ({stats['bytes'] / 1e6:.1f} MB, "
+        f"{stats['bytes_per_second'] / 1e6:.1f} MB/s) to {args.output}",
+        file=sys.stderr,
+    )
+    return EXIT_OK
+
+
+def _run_single_bytes(email, args):
+    """Write plain output for _run_single through the bytes pipeline."""
+    keywords = parse_keywords(args.keywords)
+    if not args.output:
+        if args.workers and args.workers > 1 and not args.offset and args.limit is None:
+            chunks = iter_email_variation_chunks_parallel(
+                email,
+                args.hyphen_underscore,
+                keywords,
+                args.workers,
+                provider_rules=args.provider_rules,
+            )
+        else:
+            chunks = iter_email_variation_chunks(
+                email,
+                args.hyphen_underscore,
+                keywords,
+                args.provider_rules,
+                args.offset,
+                args.limit,
+            )
+        sys.stdout.flush()
+        write_chunks(chunks, sys.stdout.fileno())
+        return EXIT_OK
+
+    stats = write_email_variations(
+        email,
+        args.output,
+        args.hyphen_underscore,
+        keywords,
+        args.provider_rules,
+        offset=args.offset,
+        limit=args.limit,
+        workers=args.workers,
+    )
+    print(
+        f"Wrote {stats['lines']} lines ({stats['bytes'] / 1e6:.1f} MB, "
+        f"{stats['bytes_per_second'] / 1e6:.1f} MB/s) to {args.output}",
+        file=sys.stderr,
+    )
+    return EXIT_OK
+
+
+def _run_interactive():
+    """Prompt for the options, print the variations and save them."""
     # Get user input
     email = input("Enter your email address: ").strip()
     include_hyphen_underscore = (
         input("Include hyphen/underscore variations? (y/n): ").strip().lower() == "y"
     )
-    custom_keywords_input = input(
-        "Enter custom keywords for + variations (comma-separated, or press Enter for defaults): "
-    ).strip()
-
-    # Parse custom keywords
-    custom_keywords = (
-        [k.strip() for k in custom_keywords_input.split(",")]
-        if custom_keywords_input
-        else None
+    custom_keywords = parse_keywords(
+        input(
+            "Enter custom keywords for + variations (comma-separated, or press Enter for defaults): "
+        )
     )
 
     # Generate variations
@@ -120,7 +2390,232 @@ def main():
     # Save to file
     filename = save_variations_to_file(variations)
     print(f"\nVariations saved to {filename}")
+    return EXIT_OK
+
+
+def _run_classify(args):
+    """Run the --classify CLI mode against an index of --bases."""
+    if not args.bases and not args.index_db:
+        print("error: --classify needs --bases or --index-db", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+
+    try:
+        with VariantIndex(args.index_db, args.provider_rules) as index:
+            if args.bases:
+                index.add_many(read_addresses(args.bases))
+            if args.output:
+                with open(
+                    args.output, "w", encoding="utf-8", buffering=OUTPUT_BUFFER_SIZE
+                ) as f:
+                    total, matched = index.classify_file(args.classify, f)
+            else:
+                total, matched = index.classify_file(args.classify, sys.stdout)
+                sys.stdout.flush()
+    except FileNotFoundError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+
+    print(f"Matched {matched} of {total} addresses", file=sys.stderr)
+    return EXIT_OK
+
+
+def _run_dedupe(args):
+    """Run the --dedupe CLI mode, one representative per account."""
+    groups = dedupe_addresses(
+        iter_addresses(args.dedupe),
+        provider_rules=not args.fold_all,
+        max_groups=args.max_groups,
+    )
+    rows = (f"{representative}\t{count}" for representative, count in groups)
+    try:
+        if args.output:
+            write_variations(rows, args.output)
+        else:
+            write_lines(sys.stdout, rows)
+            sys.stdout.flush()
+    except FileNotFoundError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    return EXIT_OK
+
+
+def _run_to_indexed(args):
+    """Run the --to-indexed CLI mode, converting a saved text file."""
+    try:
+        stats = convert_to_indexed(args.to_indexed, args.output)
+    except FileNotFoundError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    print(
+        f"Indexed {stats['lines']} lines into {args.output}{INDEX_SUFFIX}",
+        file=sys.stderr,
+    )
+    return EXIT_OK
+
+
+def _build_parser():
+    """Build the command line argument parser."""
+    parser = argparse.ArgumentParser(
+        description="Generate email address variations.",
+        epilog="Run without arguments for interactive mode.",
+    )
+    parser.add_argument("email", nargs="?", help="base email address")
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="read addresses from FILE, one per line ('-' for stdin)",
+    )
+    parser.add_argument(
+        "--classify",
+        metavar="FILE",
+        help="map each address in FILE back to its base address ('-' for stdin)",
+    )
+    parser.add_argument(
+        "--bases", metavar="FILE", help="base addresses to index for --classify"
+    )
+    parser.add_argument(
+        "--index-db", metavar="PATH", help="SQLite file holding a persistent index"
+    )
+    parser.add_argument(
+        "--dedupe",
+        metavar="FILE",
+        help="collapse variations of the same account in FILE ('-' for stdin)",
+    )
+    parser.add_argument(
+        "--max-groups",
+        type=int,
+        default=DEFAULT_DEDUPE_GROUPS,
+        help="groups kept in memory by --dedupe before spilling to disk",
+    )
+    parser.add_argument(
+        "--fold-all",
+        action="store_true",
+        help="with --dedupe, fold dots, hyphens, underscores and tags on every "
+        "domain instead of following each provider's rules",
+    )
+    parser.add_argument(
+        "--to-indexed",
+        metavar="FILE",
+        help="convert a plain or numbered output FILE to the indexed format (-o)",
+    )
+    parser.add_argument(
+        "-o", "--output", help="write variations to this file instead of stdout"
+    )
+    parser.add_argument(
+        "--output-dir", help="write one <address>.txt file per batch address"
+    )
+    parser.add_argument(
+        "--hyphen-underscore",
+        action="store_true",
+        help="include hyphen/underscore variations",
+    )
+    parser.add_argument(
+        "--provider-rules",
+        action="store_true",
+        help="only apply the transforms the domain's mail provider routes",
+    )
+    parser.add_argument(
+        "-k", "--keywords", default="", help="comma-separated keywords for + variations"
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=["plain", "numbered", "indexed"],
+        default="plain",
+        help="output format (default: plain, one address per line; indexed "
+        "also writes an offset index for random access and needs -o)",
+    )
+    parser.add_argument(
+        "-n", "--limit", type=int, help="stop after this many variations"
+    )
+    parser.add_argument(
+        "--offset", type=int, default=0, help="skip this many variations first"
+    )
+    parser.add_argument(
+        "--min-dots", type=int, help="only variations with at least this many dots"
+    )
+    parser.add_argument(
+        "--max-dots", type=int, help="only variations with at most this many dots"
+    )
+    parser.add_argument(
+        "--max-length",
+        type=int,
+        help="only variations whose local part is at most this long",
+    )
+    parser.add_argument(
+        "--families",
+        type=lambda text: [f.strip() for f in text.split(",") if f.strip()],
+        help=f"comma-separated families to generate ({', '.join(FAMILIES)})",
+    )
+    parser.add_argument(
+        "--keyword-prefix", help="only use keywords starting with this prefix"
+    )
+    parser.add_argument(
+        "--sample",
+        type=int,
+        metavar="N",
+        help="output N variations drawn uniformly at random",
+    )
+    parser.add_argument(
+        "--seed", type=int, help="random seed for a reproducible --sample"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="number of worker processes for batch mode and plain output",
+    )
+    return parser
+
+
+def main(argv=None):
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    if args.limit is not None and args.limit < 0:
+        parser.error("--limit must not be negative")
+    if args.sample is not None and args.sample < 0:
+        parser.error("--sample must not be negative")
+    if args.offset < 0:
+        parser.error("--offset must not be negative")
+    if args.max_groups < 1:
+        parser.error("--max-groups must be at least 1")
+    if args.families and set(args.families) - set(FAMILIES):
+        parser.error(f"--families must be a subset of {', '.join(FAMILIES)}")
+    filtered = (
+        args.offset,
+        args.min_dots,
+        args.max_dots,
+        args.max_length,
+        args.families,
+        args.keyword_prefix,
+    )
+    if args.sample is not None and any(f not in (None, 0) for f in filtered):
+        parser.error("--sample cannot be combined with --offset or the filters")
+    if (args.format == "indexed" or args.to_indexed) and not args.output:
+        parser.error("the indexed format needs an output file (-o)")
+
+    try:
+        if args.batch:
+            return _run_batch(args)
+        if args.classify:
+            return _run_classify(args)
+        if args.dedupe:
+            return _run_dedupe(args)
+        if args.to_indexed:
+            return _run_to_indexed(args)
+        if args.email:
+            return _run_single(args)
+        if not sys.stdin.isatty():
+            parser.error("an email address is required when stdin is not a terminal")
+        return _run_interactive()
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head); silence the final flush
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return EXIT_OK
+    except OSError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_OUTPUT_ERROR
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
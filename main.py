@@ -1,13 +1,23 @@
 import os
 import sys
-
-from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
-from PyQt6.QtGui import QIcon
+import time
+
+from PyQt6.QtCore import (
+    QAbstractListModel,
+    QModelIndex,
+    Qt,
+    QThread,
+    QTimer,
+    pyqtSignal,
+)
+from PyQt6.QtGui import QIcon, QIntValidator, QKeySequence, QShortcut
 from PyQt6.QtWidgets import (
+    QAbstractItemView,
     QApplication,
     QCheckBox,
     QFileDialog,
     QGroupBox,
+    QHeaderView,
     QHBoxLayout,
     QLabel,
     QLineEdit,
@@ -15,12 +25,28 @@ from PyQt6.QtWidgets import (
     QMessageBox,
     QProgressBar,
     QPushButton,
-    QTextEdit,
+    QTableView,
     QVBoxLayout,
     QWidget,
 )
 
-from email_generator import generate_email_variations, save_variations_to_file
+from email_generator import (
+    VariationCache,
+    VariationSet,
+    count_email_variations,
+    iter_variation_batches,
+    numbered_lines,
+    parse_keywords,
+    sample_email_variations,
+    save_variations_to_file,
+    write_variations,
+)
+
+# Ask for confirmation before generating more variations than this
+LARGE_JOB_THRESHOLD = 1_000_000
+
+# Minimum number of seconds between two result/progress updates
+PROGRESS_UPDATE_INTERVAL = 0.1
 
 
 class ThemeManager:
@@ -63,7 +89,7 @@ class ThemeManager:
                 border-color: #3498db;
                 background-color: #f8f9fa;
             }
-            QTextEdit {
+            QTableView {
                 border: 2px solid #ddd;
                 border-radius: 6px;
                 padding: 8px;
@@ -166,7 +192,7 @@ class ThemeManager:
                 border-color: #3498db;
                 background-color: #34495e;
             }
-            QTextEdit {
+            QTableView {
                 border: 2px solid #555555;
                 border-radius: 6px;
                 padding: 8px;
@@ -352,21 +378,148 @@ class AnimatedButton(QPushButton):
 class WorkerThread(QThread):
     """Worker thread for generating email variations"""
 
-    finished = pyqtSignal(list)
-
-    def __init__(self, email, include_hyphen_underscore, custom_keywords):
+    finished = pyqtSignal(object)
+    batch_ready = pyqtSignal(object)
+    progress = pyqtSignal(object, object)
+    cancelled = pyqtSignal()
+
+    def __init__(
+        self,
+        email,
+        include_hyphen_underscore,
+        custom_keywords,
+        provider_rules=False,
+        max_results=None,
+        cache=None,
+    ):
         super().__init__()
         self.email = email
         self.include_hyphen_underscore = include_hyphen_underscore
         self.custom_keywords = custom_keywords
+        self.provider_rules = provider_rules
+        self.max_results = max_results
+        self.cache = cache
 
     def run(self):
-        variations = generate_email_variations(
-            self.email, self.include_hyphen_underscore, self.custom_keywords
+        total = count_email_variations(
+            self.email,
+            self.include_hyphen_underscore,
+            self.custom_keywords,
+            self.provider_rules,
         )
+        if not total:
+            self.finished.emit(["Invalid email format"])
+            return
+
+        # Sample large jobs down to the requested size without generating them
+        if self.max_results is not None and total > self.max_results:
+            variations = sample_email_variations(
+                self.email,
+                self.max_results,
+                None,
+                self.include_hyphen_underscore,
+                self.custom_keywords,
+                self.provider_rules,
+            )
+            self.progress.emit(len(variations), len(variations))
+            self.finished.emit(variations)
+            return
+
+        # Re-clicks of Generate with the same options are served from cache
+        if self.cache is not None:
+            variations = self.cache.lookup(
+                self.email,
+                self.include_hyphen_underscore,
+                self.custom_keywords,
+                self.provider_rules,
+            )
+            if variations is not None:
+                self.progress.emit(len(variations), total)
+                self.finished.emit(variations)
+                return
+
+        # Stream results to the UI in throttled batches while generating,
+        # keeping them as compact VariationSets rather than strings
+        variations = None
+        pending = None
+        last_update = 0.0
+        for batch in iter_variation_batches(
+            self.email,
+            self.include_hyphen_underscore,
+            self.custom_keywords,
+            provider_rules=self.provider_rules,
+            ordered=True,
+            compact=True,
+        ):
+            if self.isInterruptionRequested():
+                self.cancelled.emit()
+                return
+
+            if variations is None:
+                variations = VariationSet(batch.space)
+            if pending is None:
+                pending = VariationSet(batch.space)
+            variations.extend(batch)
+            pending.extend(batch)
+            now = time.monotonic()
+            if now - last_update >= PROGRESS_UPDATE_INTERVAL:
+                last_update = now
+                self.batch_ready.emit(pending)
+                self.progress.emit(len(variations), total)
+                pending = None
+
+        if pending is not None:
+            self.batch_ready.emit(pending)
+        self.progress.emit(len(variations), total)
+        if self.cache is not None:
+            self.cache.store(
+                self.email,
+                variations,
+                self.include_hyphen_underscore,
+                self.custom_keywords,
+                self.provider_rules,
+            )
         self.finished.emit(variations)
 
 
+class VariationListModel(QAbstractListModel):
+    """Lazy list model that only formats the rows the view asks for"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.variations = []
+
+    def set_variations(self, variations):
+        """Replace the backing sequence (a list or any indexable sequence)"""
+        self.beginResetModel()
+        self.variations = variations
+        self.endResetModel()
+
+    def append_variations(self, batch):
+        """Append rows without touching existing rows"""
+        if not self.variations:
+            self.set_variations(batch)
+            return
+
+        start = len(self.variations)
+        self.beginInsertRows(QModelIndex(), start, start + len(batch) - 1)
+        self.variations.extend(batch)
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.variations)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            row = index.row()
+            return f"{row + 1:3d}. {self.variations[row]}"
+        return None
+
+
 class EmailVariationsUI(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -439,6 +592,15 @@ class EmailVariationsUI(QMainWindow):
         )
         options_layout.addWidget(self.hyphen_underscore_check)
 
+        self.provider_rules_check = QCheckBox(
+            "🎯 Only generate variations the provider routes"
+        )
+        self.provider_rules_check.setToolTip(
+            "Apply Gmail dots only on Gmail, Yahoo '-' aliases on Yahoo, "
+            "Fastmail subdomain addressing, etc. Unknown domains get every variation"
+        )
+        options_layout.addWidget(self.provider_rules_check)
+
         # Custom keywords input
         keywords_layout = QHBoxLayout()
         keywords_label = QLabel("Keywords:")
@@ -451,6 +613,19 @@ class EmailVariationsUI(QMainWindow):
         keywords_layout.addWidget(self.keywords_input)
         options_layout.addLayout(keywords_layout)
 
+        # Max results input, larger jobs are randomly sampled down
+        max_results_layout = QHBoxLayout()
+        max_results_label = QLabel("Max results:")
+        max_results_label.setMinimumWidth(120)
+        self.max_results_input = QLineEdit()
+        self.max_results_input.setValidator(QIntValidator(1, 2**31 - 1, self))
+        self.max_results_input.setPlaceholderText(
+            "🎲 e.g., 500 (random sample, leave blank for all variations)"
+        )
+        max_results_layout.addWidget(max_results_label)
+        max_results_layout.addWidget(self.max_results_input)
+        options_layout.addLayout(max_results_layout)
+
         input_layout.addLayout(options_layout)
         layout.addWidget(input_group)
 
@@ -460,11 +635,18 @@ class EmailVariationsUI(QMainWindow):
         self.progress_bar.setTextVisible(True)
         layout.addWidget(self.progress_bar)
 
-        # Generate button
+        # Generate and cancel buttons
+        generate_layout = QHBoxLayout()
         self.generate_button = AnimatedButton("🚀 Generate Variations")
         self.generate_button.clicked.connect(self.generate_variations)
         self.generate_button.setEnabled(False)
-        layout.addWidget(self.generate_button)
+        generate_layout.addWidget(self.generate_button)
+
+        self.cancel_button = AnimatedButton("⛔ Cancel", is_secondary=True)
+        self.cancel_button.clicked.connect(self.cancel_generation)
+        self.cancel_button.setVisible(False)
+        generate_layout.addWidget(self.cancel_button)
+        layout.addLayout(generate_layout)
 
         # Output section
         output_group = QGroupBox("📋 Generated Variations")
@@ -481,12 +663,24 @@ class EmailVariationsUI(QMainWindow):
         """)
         output_layout.addWidget(self.stats_label)
 
-        # Output text area
-        self.output_area = QTextEdit()
-        self.output_area.setReadOnly(True)
-        self.output_area.setPlaceholderText(
-            "Generated email variations will appear here..."
+        # Output table, only the visible rows are ever formatted
+        self.output_model = VariationListModel(self)
+        self.output_area = QTableView()
+        self.output_area.setModel(self.output_model)
+        self.output_area.horizontalHeader().hide()
+        self.output_area.horizontalHeader().setStretchLastSection(True)
+        self.output_area.verticalHeader().hide()
+        self.output_area.verticalHeader().setSectionResizeMode(
+            QHeaderView.ResizeMode.Fixed
         )
+        self.output_area.verticalHeader().setDefaultSectionSize(22)
+        self.output_area.setShowGrid(False)
+        self.output_area.setSelectionBehavior(
+            QAbstractItemView.SelectionBehavior.SelectRows
+        )
+        self.output_area.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        copy_shortcut = QShortcut(QKeySequence.StandardKey.Copy, self.output_area)
+        copy_shortcut.activated.connect(self.copy_selected)
         output_layout.addWidget(self.output_area)
 
         layout.addWidget(output_group)
@@ -520,10 +714,8 @@ class EmailVariationsUI(QMainWindow):
         self.variations = []
         self.worker = None
 
-        # Animation timer for progress bar
-        self.animation_timer = QTimer()
-        self.animation_timer.timeout.connect(self.animate_progress)
-        self.animation_value = 0
+        # Results of earlier runs, reused when Generate is clicked again
+        self.cache = VariationCache()
 
         # Apply initial theme
         self.apply_theme()
@@ -586,6 +778,7 @@ class EmailVariationsUI(QMainWindow):
         self.generate_button.set_dark_mode(self.is_dark_mode)
         self.save_button.set_dark_mode(self.is_dark_mode)
         self.browse_button.set_dark_mode(self.is_dark_mode)
+        self.cancel_button.set_dark_mode(self.is_dark_mode)
         self.theme_toggle_button.set_dark_mode(self.is_dark_mode)
 
     def validate_input(self):
@@ -604,46 +797,118 @@ class EmailVariationsUI(QMainWindow):
         if file_path:
             self.file_path_input.setText(file_path)
 
-    def animate_progress(self):
-        """Animate progress bar during generation"""
-        self.animation_value = (self.animation_value + 5) % 101
-        self.progress_bar.setValue(self.animation_value)
+    def copy_selected(self):
+        """Copy the selected variations to the clipboard"""
+        rows = sorted(index.row() for index in self.output_area.selectedIndexes())
+        if rows:
+            QApplication.clipboard().setText(
+                "\n".join(self.output_model.variations[row] for row in rows)
+            )
+
+    def update_progress(self, done, total):
+        """Show the real generation progress"""
+        percent = done * 100 // total if total else 100
+        self.progress_bar.setValue(percent)
+        self.progress_bar.setFormat(
+            f"Generating variations... {done:,} / {total:,} (%p%)"
+        )
+
+    def on_batch_ready(self, batch):
+        """Append a batch of freshly generated variations to the view"""
+        self.output_model.append_variations(batch)
+        self.stats_label.setText(
+            f"⏳ {self.output_model.rowCount():,} variations so far..."
+        )
+
+    def cancel_generation(self):
+        """Ask the worker thread to stop"""
+        if self.worker is not None:
+            self.cancel_button.setEnabled(False)
+            self.cancel_button.setText("⏳ Cancelling...")
+            self.worker.requestInterruption()
+
+    def reset_generation_controls(self):
+        """Hide the progress controls once generation has ended"""
+        self.progress_bar.setVisible(False)
+        self.cancel_button.setVisible(False)
+        self.generate_button.setEnabled(True)
+        self.generate_button.setText("🚀 Generate Variations")
+
+    def on_generation_cancelled(self):
+        """Handle a cancelled generation"""
+        self.reset_generation_controls()
+        self.worker.wait()
+        self.worker = None
+        self.output_model.set_variations([])
+        self.stats_label.setText("⛔ Generation cancelled")
 
     def generate_variations(self):
         """Generate email variations in a separate thread"""
         email = self.email_input.text().strip()
         include_hyphen_underscore = self.hyphen_underscore_check.isChecked()
-        keywords_text = self.keywords_input.text().strip()
-        custom_keywords = (
-            [k.strip() for k in keywords_text.split(",")] if keywords_text else None
+        custom_keywords = parse_keywords(self.keywords_input.text())
+        provider_rules = self.provider_rules_check.isChecked()
+        max_results_text = self.max_results_input.text().strip()
+        max_results = int(max_results_text) if max_results_text else None
+
+        # Size the job up front and confirm oversized ones
+        total = count_email_variations(
+            email, include_hyphen_underscore, custom_keywords, provider_rules
         )
+        if max_results is not None:
+            total = min(total, max_results)
+        if total > LARGE_JOB_THRESHOLD:
+            reply = QMessageBox.question(
+                self,
+                "⚠️ Large Job",
+                f"This will generate {total:,} variations and may take a while.\n\n"
+                "Do you want to continue?",
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
 
-        # Show progress bar and start animation
-        self.progress_bar.setVisible(True)
+        # Show progress bar and cancel button
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
         self.progress_bar.setFormat("Generating variations... %p%")
-        self.animation_timer.start(50)
+        self.progress_bar.setVisible(True)
+        self.cancel_button.setText("⛔ Cancel")
+        self.cancel_button.setEnabled(True)
+        self.cancel_button.setVisible(True)
         self.generate_button.setEnabled(False)
         self.generate_button.setText("⏳ Generating...")
 
+        # Clear previous results, new ones stream in as they are generated
+        self.variations = []
+        self.output_model.set_variations([])
+        self.save_button.setEnabled(False)
+
         # Start worker thread
-        self.worker = WorkerThread(email, include_hyphen_underscore, custom_keywords)
+        self.worker = WorkerThread(
+            email,
+            include_hyphen_underscore,
+            custom_keywords,
+            provider_rules,
+            max_results,
+            self.cache,
+        )
+        self.worker.batch_ready.connect(self.on_batch_ready)
+        self.worker.progress.connect(self.update_progress)
         self.worker.finished.connect(self.on_variations_generated)
+        self.worker.cancelled.connect(self.on_generation_cancelled)
         self.worker.start()
 
     def on_variations_generated(self, variations):
         """Handle completion of variation generation"""
-        # Stop animation and hide progress bar
-        self.animation_timer.stop()
-        self.progress_bar.setVisible(False)
-        self.generate_button.setEnabled(True)
-        self.generate_button.setText("🚀 Generate Variations")
+        # Hide progress bar
+        self.reset_generation_controls()
 
         # Store variations
         self.variations = variations
 
         # Display results
-        self.output_area.clear()
         if variations == ["Invalid email format"]:
+            self.output_model.set_variations([])
             QMessageBox.critical(
                 self,
                 "❌ Error",
@@ -660,11 +925,11 @@ class EmailVariationsUI(QMainWindow):
                     "QLabel { color: #e74c3c; font-weight: bold; }"
                 )
         else:
-            # Display variations with numbering
-            numbered_variations = [
-                f"{i + 1:3d}. {var}" for i, var in enumerate(variations)
-            ]
-            self.output_area.setText("\n".join(numbered_variations))
+            # Streamed runs already show every row; resetting the model would
+            # lose the scroll position and selection. Cache hits and samples
+            # were not streamed, so they are loaded here
+            if self.output_model.rowCount() != len(variations):
+                self.output_model.set_variations(variations)
 
             # Update stats
             self.stats_label.setText(
@@ -721,12 +986,7 @@ class EmailVariationsUI(QMainWindow):
             # Save variations
             if file_path.endswith(".txt"):
                 # Save as numbered list for text files
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write("Email Variations Generated\n")
-                    f.write("=" * 30 + "\n\n")
-                    for i, variation in enumerate(self.variations, 1):
-                        f.write(f"{i:3d}. {variation}\n")
-                    f.write(f"\nTotal: {len(self.variations)} variations\n")
+                write_variations(numbered_lines(self.variations), file_path)
             else:
                 # Save plain format for other file types
                 save_variations_to_file(self.variations, file_path)
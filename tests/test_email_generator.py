@@ -0,0 +1,601 @@
+import gzip
+import io
+import os
+import random
+import sys
+from itertools import islice
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import email_generator  # noqa: E402
+from email_generator import (  # noqa: E402
+    DEFAULT_SHARD_SIZE,
+    IndexedVariations,
+    InvalidEmailError,
+    VariantIndex,
+    VariationCache,
+    VariationSet,
+    VariationSpace,
+    _dot_shard_offset,
+    canonicalize,
+    convert_to_indexed,
+    count_email_variations,
+    dedupe_addresses,
+    email_error,
+    generate_batch,
+    generate_email_variations,
+    is_valid_email,
+    iter_dot_variations,
+    iter_email_variation_chunks,
+    iter_email_variation_chunks_parallel,
+    iter_email_variations,
+    iter_sorted_email_variations,
+    iter_variation_batches,
+    numbered_lines,
+    parse_keywords,
+    sample_email_variations,
+    validate_email,
+    validate_many,
+    write_email_variations,
+    write_indexed_variations,
+    write_variations,
+)
+
+ADDRESSES = [
+    "john@gmail.com",
+    "john.doe@gmail.com",
+    "a.b.c@example.com",
+    "j@example.org",
+    "jo_hn-d@mail.co",
+    "ab..c@gmail.com",
+    ".abc@gmail.com",
+    "abcdefghij@fastmail.com",
+]
+OPTIONS = [(False, None), (True, None), (True, ["b", "a", "b"])]
+
+
+def baseline_variations(email, include_hyphen_underscore=False, keywords=None):
+    """The original brute-force generator, kept as the reference output."""
+    username, domain = email.split("@")
+    variations = {email}
+
+    positions = len(username) - 1
+    for mask in range(2**positions):
+        variation = list(username)
+        offset = 0
+        for pos in range(positions):
+            if (mask >> pos) & 1:
+                variation.insert(pos + 1 + offset, ".")
+                offset += 1
+        variation = "".join(variation)
+        if ".." not in variation and variation[0] != "." and variation[-1] != ".":
+            variations.add(f"{variation}@{domain}")
+
+    for keyword in keywords or ["netflix", "amazon", "signup", "test", "shop"]:
+        variations.add(f"{username}+{keyword}@{domain}")
+
+    if include_hyphen_underscore:
+        variations.add(f"{username.replace('.', '-')}@{domain}")
+        variations.add(f"{username.replace('.', '_')}@{domain}")
+
+    return sorted(variations)
+
+
+@pytest.mark.parametrize("email", ADDRESSES)
+@pytest.mark.parametrize("include_hyphen_underscore,keywords", OPTIONS)
+def test_matches_baseline(email, include_hyphen_underscore, keywords):
+    options = (email, include_hyphen_underscore, keywords)
+    expected = baseline_variations(*options)
+
+    assert generate_email_variations(*options) == expected
+    assert sorted(iter_email_variations(*options)) == expected
+    assert list(iter_sorted_email_variations(*options)) == expected
+
+
+@pytest.mark.parametrize("email", ADDRESSES)
+@pytest.mark.parametrize("provider_rules", [False, True])
+def test_count_matches_len(email, provider_rules):
+    variations = list(iter_email_variations(email, True, None, provider_rules))
+    space = VariationSpace(email, True, None, provider_rules)
+
+    assert len(set(variations)) == len(variations)
+    assert count_email_variations(email, True, None, provider_rules) == len(variations)
+    assert len(space) == len(variations)
+
+
+@pytest.mark.parametrize("email", ADDRESSES)
+@pytest.mark.parametrize("provider_rules", [False, True])
+def test_space_round_trip(email, provider_rules):
+    space = VariationSpace(email, True, ["x", "y"], provider_rules)
+
+    assert list(space) == list(
+        iter_email_variations(email, True, ["x", "y"], provider_rules)
+    )
+    for index, address in enumerate(space):
+        assert space[index] == address
+        assert space.index(address) == index
+        assert address in space
+    assert "nobody@example.com" not in space
+
+
+def test_space_round_trip_long_username():
+    # Past the cached table size, unranking builds each address directly
+    space = VariationSpace("abcdefghijklmnopqrstuvwxyz@gmail.com")
+    for index in [0, 1, 12345, 2**24 + 7, space.dot_count - 1, len(space) - 1]:
+        assert space.index(space[index]) == index
+
+
+@pytest.mark.parametrize("email", ADDRESSES)
+@pytest.mark.parametrize("provider_rules", [False, True])
+def test_sorted_ranks(email, provider_rules):
+    space = VariationSpace(email, True, ["x", "b"], provider_rules)
+    ranks = list(space.sorted_ranks())
+
+    assert sorted(ranks) == list(range(len(space)))
+    assert [space[rank] for rank in ranks] == sorted(space)
+
+
+@pytest.mark.parametrize("email", ["a.bcdefg@gmail.com", "abcdefghijkl@example.com"])
+@pytest.mark.parametrize("offset", [0, 1, 37, 63, 64, 2047, 2048, 5000])
+@pytest.mark.parametrize("limit", [None, 0, 1, 10, 100])
+def test_offset_limit(email, offset, limit):
+    full = list(iter_email_variations(email, True))
+    expected = full[offset:] if limit is None else full[offset : offset + limit]
+    text = "".join(address + "\n" for address in expected).encode("utf-8")
+
+    variations = iter_email_variations(email, True, offset=offset, limit=limit)
+    assert list(variations) == expected
+    chunks = iter_email_variation_chunks(email, True, None, False, offset, limit)
+    assert b"".join(chunks) == text
+
+
+def test_offset_limit_long_username():
+    email = "abcdefghijklmnopqrstuvwxyz0123456789@gmail.com"
+    space = VariationSpace(email)
+    for offset in [0, 1000, 2**30 + 5, space.dot_count - 3]:
+        assert list(iter_email_variations(email, offset=offset, limit=5)) == [
+            space[index] for index in range(offset, min(offset + 5, len(space)))
+        ]
+
+
+def _local(address):
+    return address.rpartition("@")[0]
+
+
+@pytest.mark.parametrize(
+    "filters,keep",
+    [
+        ({"min_dots": 2}, lambda a: _local(a).count(".") >= 2),
+        ({"max_dots": 1}, lambda a: _local(a).count(".") <= 1),
+        (
+            {"min_dots": 1, "max_dots": 2, "max_length": 10},
+            lambda a: 1 <= _local(a).count(".") <= 2 and len(_local(a)) <= 10,
+        ),
+        ({"max_length": 8}, lambda a: len(_local(a)) <= 8),
+        ({"families": ["plus"]}, lambda a: "+" in a),
+        ({"families": ["dot"]}, lambda a: not set("+-_") & set(a)),
+        ({"keyword_prefix": "s"}, lambda a: "+" not in a or "+s" in a),
+    ],
+)
+def test_filters(filters, keep):
+    email = "a.bcdefg@gmail.com"
+    full = list(iter_email_variations(email, True))
+    expected = [address for address in full if keep(address)]
+    filtered = list(iter_email_variations(email, True, **filters))
+
+    assert sorted(filtered) == sorted(expected)
+    assert len(set(filtered)) == len(filtered)
+    # Slices of a filtered run are slices of the whole filtered run
+    for offset in [0, 3, len(filtered) - 1]:
+        sliced = iter_email_variations(email, True, offset=offset, limit=4, **filters)
+        assert list(sliced) == list(islice(filtered, offset, offset + 4))
+
+
+def test_parse_keywords_drops_empty_entries():
+    assert parse_keywords("x,") == ["x"]
+    assert parse_keywords(" a , ,b ") == ["a", "b"]
+    assert parse_keywords(" , ") is None
+    assert parse_keywords("") is None
+
+
+@pytest.mark.parametrize("keywords", [["x", ""], ["x", " "], parse_keywords("x,")])
+def test_subdomain_family_skips_empty_keywords(keywords):
+    email = "abc@fastmail.com"
+    variations = list(iter_email_variations(email, True, keywords, True))
+
+    assert "x@abc.fastmail.com" in variations
+    for address in variations:
+        assert is_valid_email(address)
+        assert canonicalize(address, True) == canonicalize(email, True)
+
+
+@pytest.mark.parametrize("username", ["abcdef", "a.bc.d", "x"])
+def test_dot_shard_offset(username):
+    suffix = "@example.com"
+    position = 0
+    for mask, address in enumerate(iter_dot_variations(username, suffix)):
+        assert _dot_shard_offset(username, suffix, mask) == position
+        position += len(address) + 1
+    assert _dot_shard_offset(username, suffix, mask + 1) == position
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_parallel_output_matches_serial(tmp_path, compression):
+    # Enough masks for several shards
+    email = "abcdefghijklmnopqrs@fastmail.com"
+    assert VariationSpace(email).dot_count > 2 * DEFAULT_SHARD_SIZE
+    expected = b"".join(iter_email_variation_chunks(email, True, ["x", "y"], True))
+
+    chunks = iter_email_variation_chunks_parallel(
+        email, True, ["x", "y"], workers=2, shard_size=5000, provider_rules=True
+    )
+    assert b"".join(chunks) == expected
+
+    path = tmp_path / "out.txt"
+    stats = write_email_variations(
+        email, str(path), True, ["x", "y"], True, compression, workers=2
+    )
+    data = path.read_bytes()
+    if compression:
+        data = gzip.decompress(data)
+    assert data == expected
+    assert stats["lines"] == expected.count(b"\n")
+
+
+def _variant_list(count, seed):
+    """Random variants of ``count`` accounts, each appearing several times."""
+    rng = random.Random(seed)
+    spaces = [VariationSpace(f"user{i}.x@gmail.com", True) for i in range(count)]
+    return [space[rng.randrange(len(space))] for space in spaces for _ in range(3)] + [
+        "not-an-address",
+        "not-an-address",
+    ]
+
+
+def test_dedupe_follows_provider_rules():
+    addresses = ["j.smith@outlook.com", "jsmith@outlook.com", "j.s.mith@gmail.com"]
+    assert list(dedupe_addresses(addresses + ["jsmith+x@gmail.com"])) == [
+        ("j.smith@outlook.com", 1),
+        ("jsmith@outlook.com", 1),
+        ("j.s.mith@gmail.com", 2),
+    ]
+    assert len(list(dedupe_addresses(addresses, provider_rules=False))) == 2
+
+
+def test_dedupe_spill_matches_memory(tmp_path, monkeypatch):
+    addresses = _variant_list(300, 14)
+    random.Random(0).shuffle(addresses)
+    expected = list(dedupe_addresses(addresses))
+
+    levels = set()
+    partition_of = email_generator._partition_of
+
+    def record(key, level, partitions):
+        levels.add(level)
+        return partition_of(key, level, partitions)
+
+    monkeypatch.setattr(email_generator, "_partition_of", record)
+    spilled = list(
+        dedupe_addresses(addresses, max_groups=10, partitions=3, tmpdir=tmp_path)
+    )
+
+    # Partitions of ~100 groups are split again until each fits in 10
+    assert len(levels) > 1
+    assert sorted(spilled) == sorted(expected)
+    assert sum(count for _, count in spilled) == len(addresses)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_batch_combined_output(tmp_path, workers):
+    emails = [
+        "a.b@gmail.com",
+        "bad",
+        "abcdefghijklmnopqrs@fastmail.com",
+        "a.b@gmail.com",
+    ]
+    valid = ["a.b@gmail.com", "abcdefghijklmnopqrs@fastmail.com"]
+    expected = "".join(
+        address + "\n"
+        for email in valid
+        for address in iter_email_variations(email, True, ["k"], True)
+    )
+    options = {
+        "include_hyphen_underscore": True,
+        "custom_keywords": ["k"],
+        "workers": workers,
+        "provider_rules": True,
+    }
+
+    stream = io.StringIO()
+    summary = generate_batch(emails, output=stream, **options)
+    assert stream.getvalue() == expected
+    assert summary["variations"] == expected.count("\n")
+    assert summary["duplicates"] == 1 and len(summary["invalid"]) == 1
+
+    # Real files are written through their binary buffer
+    path = tmp_path / "all.txt"
+    with open(path, "w", encoding="utf-8") as output:
+        output.write("first\n")
+        generate_batch(emails, output=output, **options)
+        output.write("last\n")
+    assert path.read_text(encoding="utf-8") == "first\n" + expected + "last\n"
+
+
+ROUND_TRIP_ADDRESSES = [
+    "John.Doe@gmail.com",
+    "jsmith@googlemail.com",
+    "j.smith@outlook.com",
+    "john_doe@yahoo.com",
+    "abc@fastmail.com",
+    "a.b-c@example.com",
+]
+
+
+@pytest.mark.parametrize("email", ROUND_TRIP_ADDRESSES)
+@pytest.mark.parametrize("provider_rules", [False, True])
+def test_canonicalize_round_trip(email, provider_rules):
+    base = canonicalize(email, provider_rules)
+    for address in iter_email_variations(email, True, ["x", "y"], provider_rules):
+        assert canonicalize(address, provider_rules) == base
+
+
+def test_canonicalize_rejects_malformed():
+    for address in ["", "abc", "@gmail.com", "abc@"]:
+        with pytest.raises(ValueError):
+            canonicalize(address)
+
+
+@pytest.mark.parametrize("on_disk", [False, True])
+@pytest.mark.parametrize("provider_rules", [False, True])
+def test_variant_index_round_trip(tmp_path, on_disk, provider_rules):
+    path = str(tmp_path / "index.db") if on_disk else None
+    with VariantIndex(path, provider_rules) as index:
+        assert index.add_many(ROUND_TRIP_ADDRESSES + ["bad"]) == 6
+        # Invalid and already indexed addresses are not counted
+        assert index.add_many(["bad", "John.Doe@gmail.com"]) == 0
+        assert index.add("other@example.org") == 1
+        assert len(index) == 7
+
+        for email in ROUND_TRIP_ADDRESSES:
+            for address in iter_email_variations(email, True, None, provider_rules):
+                assert index.lookup(address) == email
+        assert index.lookup("nobody@example.org") is None
+        assert index.lookup("not an address") is None
+
+
+def test_variant_index_keeps_colliding_bases():
+    index = VariantIndex()
+    assert index.add_many(["ab@example.com", "a.b@example.com"]) == 2
+    assert index.lookup_all("a-b+x@example.com") == [
+        "ab@example.com",
+        "a.b@example.com",
+    ]
+
+
+def test_sample_is_deterministic_and_distinct():
+    # A space far too large to enumerate
+    email = "abcdefghijklmnopqrstuvwxyz0123456789@gmail.com"
+    sample = sample_email_variations(email, 500, seed=15)
+
+    assert sample == sample_email_variations(email, 500, seed=15)
+    assert sample != sample_email_variations(email, 500, seed=16)
+    assert len(sample) == len(set(sample)) == 500
+    assert sample == sorted(sample)
+    space = VariationSpace(email)
+    assert all(address in space for address in sample)
+
+
+def test_sample_edge_cases():
+    email = "a.bc@gmail.com"
+    assert sample_email_variations(email, 0, seed=1) == []
+    assert sample_email_variations(email, 10**6) == generate_email_variations(email)
+    assert sample_email_variations("bad", 3) == ["Invalid email format"]
+    with pytest.raises(ValueError):
+        sample_email_variations(email, -1)
+
+
+def test_sample_is_uniform():
+    # Every variation of a small space should be drawn about equally often
+    email = "abcd@example.com"
+    counts = dict.fromkeys(generate_email_variations(email), 0)
+    for seed in range(2000):
+        for address in sample_email_variations(email, 3, seed=seed):
+            counts[address] += 1
+    expected = 2000 * 3 / len(counts)
+    assert all(0.7 * expected < count < 1.3 * expected for count in counts.values())
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_variation_set(ordered):
+    space = VariationSpace("a.bcde@gmail.com", True, ["x", "y"])
+    ranks = list(space.sorted_ranks()) if ordered else list(range(len(space)))
+    variations = VariationSet(space)
+    for start in range(0, len(ranks), 7):
+        variations.extend(ranks[start : start + 7])
+
+    expected = [space[rank] for rank in ranks]
+    assert list(variations) == expected
+    assert variations[3] == expected[3]
+    assert list(variations[2:9]) == expected[2:9]
+    for position, address in enumerate(expected):
+        assert address in variations
+        assert variations.index(address) == position
+    assert "nobody@gmail.com" not in variations
+    with pytest.raises(ValueError):
+        variations.index("nobody@gmail.com")
+
+
+def test_variation_set_membership_after_extend():
+    space = VariationSpace("abcdef@example.com")
+    variations = VariationSet(space, [5, 1, 9])
+    assert space[9] in variations and space[2] not in variations
+
+    # The sorted lookup copy must be rebuilt after appending
+    variations.extend(VariationSet(space, [2, 0]))
+    assert space[2] in variations and space[0] in variations
+    assert variations.index(space[0]) == 4
+
+    variations.add(space[2])
+    variations.add(space[3])
+    assert list(variations.ranks) == [5, 1, 9, 2, 0, 3]
+
+
+def test_compact_batches_match_strings():
+    email = "a.bcdefgh@gmail.com"
+    for ordered in (False, True):
+        batches = iter_variation_batches(email, True, batch_size=50, ordered=ordered)
+        compact = iter_variation_batches(
+            email, True, batch_size=50, ordered=ordered, compact=True
+        )
+        assert [list(b) for b in compact] == list(batches)
+
+
+def test_indexed_variations(tmp_path):
+    # Small chunks so offsets carry over between chunks; one non-ASCII line
+    variations = generate_email_variations("a.bcdef@gmail.com", True) + ["é@x.com"]
+    path = str(tmp_path / "out.txt")
+    stats = write_indexed_variations(variations, path, chunk_size=7)
+    assert stats["lines"] == len(variations)
+
+    with IndexedVariations(path) as indexed:
+        assert len(indexed) == len(variations)
+        assert list(indexed) == variations
+        assert [indexed[i] for i in range(len(variations))] == variations
+        assert indexed[-1] == "é@x.com"
+        assert indexed[3:10:2] == variations[3:10:2]
+        with pytest.raises(IndexError):
+            indexed[len(variations)]
+
+
+def test_indexed_variations_empty_and_mismatched(tmp_path):
+    path = str(tmp_path / "empty.txt")
+    write_indexed_variations([], path)
+    with IndexedVariations(path) as indexed:
+        assert len(indexed) == 0 and list(indexed) == []
+
+    path = str(tmp_path / "out.txt")
+    write_indexed_variations(["a@b.com", "c@d.com"], path)
+    with open(path, "ab") as f:
+        f.write(b"e@f.com\n")
+    with pytest.raises(ValueError):
+        IndexedVariations(path)
+
+
+@pytest.mark.parametrize("numbered", [False, True])
+def test_convert_to_indexed(tmp_path, numbered):
+    variations = generate_email_variations("a.bcd@gmail.com")
+    source = str(tmp_path / "saved.txt")
+    write_variations(numbered_lines(variations) if numbered else variations, source)
+
+    path = str(tmp_path / "out.txt")
+    convert_to_indexed(source, path)
+    with IndexedVariations(path) as indexed:
+        assert list(indexed) == variations
+
+
+def test_cache_results_and_keys():
+    cache = VariationCache()
+    email = "a.bcd@gmail.com"
+    expected = generate_email_variations(email, True, ["x", "y"])
+
+    assert cache.lookup(email, True, ["x", "y"]) is None
+    assert cache.get(email, True, ["x", "y"]) == expected
+    # Keywords are normalized, and a copy is returned each time
+    result = cache.get(email, True, ["y", "x", "x"])
+    assert result == expected
+    result.clear()
+    assert cache.lookup(email, True, ["x", "y"]) == expected
+    assert len(cache) == 1
+
+    # The same username on another domain is a separate result
+    assert cache.get("a.bcd@example.com") == generate_email_variations(
+        "a.bcd@example.com"
+    )
+    assert len(cache) == 2
+    assert generate_email_variations(email, True, ["x", "y"], cache=cache) == expected
+
+
+def test_cache_evicts_least_recently_used():
+    emails = [f"user{i}.abcdef@gmail.com" for i in range(6)]
+    cache = VariationCache()
+    cache.get(emails[0])
+    cache = VariationCache(max_bytes=3 * cache.current_bytes)
+
+    for email in emails[:3]:
+        cache.get(email)
+    cache.get(emails[0])  # now the most recently used
+    cache.get(emails[3])
+
+    assert cache.current_bytes <= cache.max_bytes
+    assert cache.lookup(emails[1]) is None
+    assert cache.lookup(emails[0]) is not None
+    assert cache.lookup(emails[3]) is not None
+
+    # A single result larger than the budget is not kept at all
+    cache = VariationCache(max_bytes=100)
+    assert cache.get(emails[4]) == generate_email_variations(emails[4])
+    assert len(cache) == 0 and cache.current_bytes == 0
+
+
+def test_cache_disk_tier(tmp_path):
+    email = "a.bcde@gmail.com"
+    expected = generate_email_variations(email)
+    cache = VariationCache(max_bytes=100, directory=str(tmp_path))
+    cache.get(email)
+    # Evicted from memory at once, but kept on disk across instances
+    assert len(cache) == 0
+    assert VariationCache(directory=str(tmp_path)).lookup(email) == expected
+
+    stored = VariationSet(VariationSpace(email), range(5))
+    cache.store("x.y@gmail.com", stored)
+    reloaded = VariationCache(directory=str(tmp_path)).lookup("x.y@gmail.com")
+    assert reloaded == list(stored)
+
+    # Corrupt blobs are treated as misses
+    for blob in tmp_path.iterdir():
+        blob.write_bytes(b"not zlib")
+    fresh = VariationCache(directory=str(tmp_path))
+    assert fresh.lookup(email) is None
+    assert fresh.get(email) == expected
+
+
+@pytest.mark.parametrize(
+    "address,reason",
+    [
+        ("john.doe@gmail.com", None),
+        ("j_d%1+x-y@sub.example.co", None),
+        ("john.doe.gmail.com", "missing @"),
+        ("a@b@gmail.com", "more than one @"),
+        ("@gmail.com", "empty username"),
+        ("jo hn@gmail.com", "invalid character in username"),
+        ("john@localhost", "domain has no top-level domain"),
+        ("john@gmail.c", "invalid domain"),
+        ("john@gm ail.com", "invalid domain"),
+    ],
+)
+def test_email_error(address, reason):
+    assert email_error(address) == reason
+    assert is_valid_email(address) == (reason is None)
+    if reason is None:
+        validate_email(address)
+    else:
+        with pytest.raises(InvalidEmailError) as error:
+            validate_email(address)
+        assert error.value.address == address
+        assert error.value.reason == reason
+        assert isinstance(error.value, ValueError)
+
+
+def test_validate_many():
+    addresses = ["b@x.com", "bad", "a@b@c.com", "a@x.com", "bad"]
+    valid, invalid = validate_many(addresses)
+    assert valid == ["b@x.com", "a@x.com"]
+    assert invalid == [
+        ("bad", "missing @"),
+        ("a@b@c.com", "more than one @"),
+        ("bad", "missing @"),
+    ]
+    assert validate_many([]) == ([], [])